@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,17 +41,21 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     "server",
     "rest_framework",
-    "django_minio_backend",
     "drf_yasg",
 ]
 
+# Приложение django_minio_backend нужно только ради команд initialize_buckets
+# и т.п.: его ready() импортирует клиент minio на каждом старте воркера.
+# Хранилище картинок (server.storage) работает и без него.
+if config("MINIO_MANAGEMENT_COMMANDS", default=False, cast=bool):
+    INSTALLED_APPS.append("django_minio_backend")
+
 MINIO_ENDPOINT = "localhost:9000"
 MINIO_ACCESS_KEY = "minioadmin"
 MINIO_SECRET_KEY = "minioadmin"
 MINIO_USE_HTTPS = False
 
 MINIO_PUBLIC_BUCKETS = ["mybucket"]
-MINIO_STORAGE_AUTO_CREATE_MEDIA_BUCKET = True
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
@@ -61,17 +65,110 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "server.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    # Число доверенных прокси перед приложением. При 0 клиентом считается
+    # REMOTE_ADDR, X-Forwarded-For от клиента игнорируется.
+    "NUM_PROXIES": config("NUM_PROXIES", default=0, cast=int),
 }
 
+# Ответы меньше порога не сжимаются: выигрыш не окупает CPU и заголовки.
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+
 REDIS_HOST = '127.0.0.1'
 REDIS_PORT = 6379
 
+MODERATION_LEASE_SECONDS = 15 * 60
+MODERATION_CLAIM_MAX = 50
+
+APP_EVENTS_QUEUE_SIZE = 100
+APP_EVENTS_HEARTBEAT_SECONDS = 15
+
+LOGIN_HISTORY_PER_USER = 100
+LOGIN_HISTORY_RETENTION_DAYS = 90
+LOGIN_HISTORY_GLOBAL_MAX = 100_000
+LOGIN_HISTORY_QUERY_MAX = 500
+
+# Верхние границы ценовых корзин для фасетов каталога.
+FACET_PRICE_BUCKETS = [500, 1000, 2500, 5000]
+FACET_CACHE_SECONDS = 60 * 60
+# Больше изменившихся услуг с прошлого обновления - фасеты пересчитываются целиком.
+FACET_INCREMENTAL_MAX_SERVERS = 1000
+FACET_REFRESH_LOCK_SECONDS = 60
+FACET_REFRESH_WAIT_SECONDS = 2
+
+DRAFT_CACHE_SECONDS = 24 * 60 * 60
+
+SERVER_DETAIL_CACHE_SECONDS = 60 * 60
+# Отсутствующие id публичных servers/<id>/ и servers/batch/ кэшируются ненадолго.
+SERVER_DETAIL_NEGATIVE_CACHE_SECONDS = 5
+PERMISSION_CACHE_SECONDS = 60 * 60
+
+# Локальный (в процессе) уровень кэшей server.tiered_cache. TTL ограничивает
+# устаревание, если сообщение об инвалидации через pub/sub потерялось.
+LOCAL_CACHE_MAX_ENTRIES = 5000
+LOCAL_CACHE_TTL_SECONDS = 30
+SERVER_BATCH_MAX_IDS = 100
+
+MY_APPLICATIONS_PAGE_SIZE = 20
+MY_APPLICATIONS_MAX_PAGE_SIZE = 100
+
+# Idempotency-Key: срок хранения ответа, время жизни блокировки выполняющегося
+# запроса и сколько повтор ждёт его завершения, прежде чем получить 409.
+IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+IDEMPOTENCY_LOCK_SECONDS = 60
+IDEMPOTENCY_WAIT_SECONDS = 10
+
+CATALOG_IMPORT_BATCH_SIZE = 1000
+CATALOG_IMPORT_MAX_REPORTED_ERRORS = 1000
+
+# Рекомендации "часто арендуют вместе" (server.recommendations): сколько
+# отдавать и сколько соседей хранить в Redis для инкрементальных обновлений.
+RECOMMENDATIONS_TOP_K = 10
+RECOMMENDATIONS_STORED = 50
+RECOMMENDATIONS_BATCH_SIZE = 5000
+RECOMMENDATIONS_TTL_SECONDS = 7 * 24 * 60 * 60
+
+# Дельта-синхронизация каталога (servers/changes/).
+CATALOG_CHANGES_PAGE_SIZE = 1000
+CATALOG_CHANGES_RETENTION_DAYS = 30
+
+# Фоновые задачи (server.jobs). JOBS_EAGER выполняет их сразу в процессе
+# запроса - для разработки и окружений без воркера run_jobs.
+JOBS_EAGER = config("JOBS_EAGER", default=False, cast=bool)
+JOBS_CONCURRENCY = config("JOBS_CONCURRENCY", default=4, cast=int)
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_BASE_SECONDS = 2
+JOBS_RETRY_MAX_SECONDS = 10 * 60
+JOBS_DEAD_LETTER_MAX = 10_000
+# Задачи воркера без продления метки дольше этого возвращаются в очередь.
+JOBS_WORKER_TIMEOUT_SECONDS = 10 * 60
+
+# Outbox событий заявок (server.outbox) и его relay в Redis Stream.
+OUTBOX_RELAY_BATCH_SIZE = 500
+OUTBOX_RELAY_POLL_SECONDS = 1
+OUTBOX_RELAY_LOCK_SECONDS = 30
+OUTBOX_STREAM_MAXLEN = 1_000_000
+
+# Лимиты token bucket в формате "<число>/<s|m|h|d>", ключ - scope троттлинга.
+THROTTLE_RATES = {
+    "login_ip": config("THROTTLE_LOGIN_IP", default="30/m"),
+    "login_username": config("THROTTLE_LOGIN_USERNAME", default="10/m"),
+    "search_ip": config("THROTTLE_SEARCH_IP", default="120/m"),
+}
+
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "server.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "server.middleware.ReplicaRoutingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -110,6 +207,45 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения: DB_REPLICA_HOSTS=host1,host2. Остальные
+# параметры подключения совпадают с основной базой.
+DATABASE_REPLICAS = []
+for index, host in enumerate(config("DB_REPLICA_HOSTS", default="", cast=Csv()), 1):
+    DATABASES[f"replica{index}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica{index}")
+
+DATABASE_ROUTERS = ["server.routers.PrimaryReplicaRouter"]
+READ_YOUR_WRITES_SECONDS = 5
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/5.2/topics/auth/passwords/
+
+# ModelBackend нужен для сессий, созданных до CachedModelBackend: Django
+# загружает пользователя сессии только через бэкенд из этого списка. Права
+# он берёт из того же user._perm_cache, без запросов к базе.
+AUTHENTICATION_BACKENDS = [
+    "server.authentication.CachedModelBackend",
+    "django.contrib.auth.backends.ModelBackend",
+]
+
+PASSWORD_HASHERS = [
+    "server.hashers.TunedArgon2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
+ARGON2_TIME_COST = config("ARGON2_TIME_COST", default=2, cast=int)
+ARGON2_MEMORY_COST = config("ARGON2_MEMORY_COST", default=19 * 1024, cast=int)
+ARGON2_PARALLELISM = config("ARGON2_PARALLELISM", default=1, cast=int)
+
+LOGIN_VERIFY_MAX_WORKERS = config("LOGIN_VERIFY_MAX_WORKERS", default=4, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -151,4 +287,3 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
-DEFAULT_FILE_STORAGE = "storages.backends.s3boto3.S3Boto3Storage"
@@ -15,32 +15,41 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+import functools
+
 from django.contrib import admin
 from django.urls import include, path
 from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="API",
-        default_version="v1",
-        description="Test description",
-        terms_of_service="https://www.example.com/terms/",
-        contact=openapi.Contact(email="contact@example.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+
+
+@functools.cache
+def get_schema_view():
+    # drf_yasg.views тянет генератор схемы и инспекторы; документация нужна
+    # редко, поэтому модуль импортируется при первом запросе к /docs/.
+    from drf_yasg import openapi
+    from drf_yasg.views import get_schema_view
+
+    schema_view = get_schema_view(
+        openapi.Info(
+            title="API",
+            default_version="v1",
+            description="Test description",
+            terms_of_service="https://www.example.com/terms/",
+            contact=openapi.Contact(email="contact@example.com"),
+            license=openapi.License(name="BSD License"),
+        ),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+    return schema_view.with_ui("swagger", cache_timeout=0)
+
+
+def schema_swagger_ui(request, *args, **kwargs):
+    return get_schema_view()(request, *args, **kwargs)
 
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("server.urls")),
-    path(
-        "docs/",
-        schema_view.with_ui("swagger", cache_timeout=0),
-        name="schema-swagger-ui",
-    ),
+    path("docs/", schema_swagger_ui, name="schema-swagger-ui"),
 ]
@@ -1,20 +1,53 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 from .models import (
     Application,
     ApplicationServer,
+    ApplicationStatusEvent,
     Server,
     ServerSpecification,
 )
 
 
+class EstimatedCountPaginator(Paginator):
+    # На больших таблицах COUNT(*) без фильтров обходится дорого, поэтому
+    # берётся оценка планировщика PostgreSQL из pg_class.reltuples.
+    estimate_threshold = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.estimate_threshold:
+                return row[0]
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
 class ServiceAdmin(admin.ModelAdmin):
     list_display = ("name", "image", "price", "is_active")
     ordering = ("id",)
+    search_fields = ("name",)
 
 
-class ServiceSpecificationAdmin(admin.ModelAdmin):
+class ServiceSpecificationAdmin(LargeTableAdmin):
     list_display = ("get_service_name", "processor", "ram", "disk", "internet_speed")
+    list_select_related = ("server",)
+    autocomplete_fields = ("server",)
     ordering = ("id",)
 
     def get_service_name(self, obj):
@@ -23,7 +56,7 @@ class ServiceSpecificationAdmin(admin.ModelAdmin):
     get_service_name.short_description = "Server"
 
 
-class ApplicationAdmin(admin.ModelAdmin):
+class ApplicationAdmin(LargeTableAdmin):
     list_display = (
         "id",
         "get_status_name",
@@ -32,6 +65,8 @@ class ApplicationAdmin(admin.ModelAdmin):
         "user_creator",
         "user_moderator",
     )
+    list_select_related = ("user_creator", "user_moderator")
+    autocomplete_fields = ("user_creator", "user_moderator")
     ordering = ("created_at",)
 
     def get_status_name(self, obj):
@@ -40,14 +75,43 @@ class ApplicationAdmin(admin.ModelAdmin):
     get_status_name.short_description = "Status"
 
 
-class ApplicationServerAdmin(admin.ModelAdmin):
+class ApplicationServerAdmin(LargeTableAdmin):
     list_display = ("id", "application", "get_service_name")
+    list_select_related = ("application", "server", "archived_server")
+    raw_id_fields = ("application", "archived_server")
+    autocomplete_fields = ("server",)
 
     def get_service_name(self, obj):
-        return f"Характеристика: {obj.server.name}"
+        return f"Характеристика: {obj.service.name}"
+
+
+class ApplicationStatusEventAdmin(LargeTableAdmin):
+    list_display = (
+        "id",
+        "application_id",
+        "previous_status",
+        "status",
+        "changed_by_id",
+        "created_at",
+        "published_at",
+    )
+    list_filter = ("status",)
+    search_fields = ("=application_id",)
+    ordering = ("-id",)
+
+    # Журнал только для чтения: правки сломали бы аудит и порядок событий.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 admin.site.register(Server, ServiceAdmin)
 admin.site.register(ServerSpecification, ServiceSpecificationAdmin)
 admin.site.register(Application, ApplicationAdmin)
 admin.site.register(ApplicationServer, ApplicationServerAdmin)
+admin.site.register(ApplicationStatusEvent, ApplicationStatusEventAdmin)
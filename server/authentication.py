@@ -0,0 +1,78 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+from django.db import close_old_connections
+
+from .tiered_cache import TieredCache
+
+PERMISSIONS_VERSION_KEY = "permissions:version"
+
+# Права пользователя ("app_label.codename") по его id, ключ perms:<id>.
+# Правка самого пользователя сбрасывает только его ключ, правка групп и их
+# прав - весь кэш сменой версии (см. server.signals).
+permission_cache = TieredCache(
+    "perms", PERMISSIONS_VERSION_KEY, settings.PERMISSION_CACHE_SECONDS, per_key=True
+)
+
+# Проверка пароля занимает поток на всё время хэширования, поэтому под ASGI
+# она выполняется в отдельном ограниченном пуле, а не в потоке sync-view.
+_executor = ThreadPoolExecutor(
+    max_workers=settings.LOGIN_VERIFY_MAX_WORKERS,
+    thread_name_prefix="login-verify",
+)
+
+
+def _authenticate(request, username, password):
+    close_old_connections()
+    try:
+        return authenticate(request, username=username, password=password)
+    finally:
+        close_old_connections()
+
+
+async def authenticate_in_pool(request, username, password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor, _authenticate, request, username, password
+    )
+
+
+def invalidate_permissions():
+    permission_cache.invalidate()
+
+
+def invalidate_user_permissions(user_id):
+    permission_cache.invalidate_key(user_id)
+
+
+class CachedModelBackend(ModelBackend):
+    # ModelBackend кэширует права только на объекте пользователя, то есть на
+    # один запрос; здесь набор прав переживает запрос в двухуровневом кэше.
+    # Сам ModelBackend остаётся в AUTHENTICATION_BACKENDS после этого класса,
+    # чтобы не разлогинить сессии, сохранённые с его путём.
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = super().authenticate(request, username, password, **kwargs)
+        if user is None and username is not None and password is not None:
+            # Иначе ModelBackend повторил бы ту же проверку пароля.
+            raise PermissionDenied
+        return user
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, "_perm_cache"):
+            model_backend = super()
+
+            def load(keys):
+                perms = model_backend.get_all_permissions(user_obj)
+                return {user_obj.pk: json.dumps(sorted(perms))}
+
+            user_obj._perm_cache = set(
+                json.loads(permission_cache.get(user_obj.pk, load))
+            )
+        return user_obj._perm_cache
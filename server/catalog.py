@@ -0,0 +1,40 @@
+from django.db import connections, router, transaction
+
+from .models import CatalogChange
+from .tiered_cache import invalidate_version
+
+CATALOG_VERSION_KEY = "catalog:version"
+# Ключ advisory-блокировки PostgreSQL для записи в журнал изменений каталога.
+CATALOG_CHANGES_LOCK_ID = 0x63617463
+
+
+def bump_catalog_version():
+    # Кроме версии в Redis сбрасывает локальные кэши каталога во всех процессах.
+    return invalidate_version(CATALOG_VERSION_KEY)
+
+
+def record_catalog_changes(server_ids):
+    server_ids = set(server_ids)
+    if not server_ids:
+        return
+
+    using = router.db_for_write(CatalogChange)
+    with transaction.atomic(using=using):
+        connection = connections[using]
+        if connection.vendor == "postgresql":
+            # Блокировка держится до коммита внешней транзакции: номера
+            # изменений выдаются в порядке фиксации, и клиент с курсором since
+            # не пропустит изменение, закоммиченное позже соседнего.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_advisory_xact_lock(%s)", [CATALOG_CHANGES_LOCK_ID]
+                )
+        CatalogChange.objects.using(using).bulk_create(
+            [CatalogChange(server_id=server_id) for server_id in server_ids]
+        )
+
+
+def latest_catalog_change():
+    return (
+        CatalogChange.objects.order_by("-id").values_list("id", flat=True).first() or 0
+    )
@@ -0,0 +1,131 @@
+import csv
+import json
+
+from django.db import transaction
+from django.utils import timezone
+
+from .catalog import bump_catalog_version, record_catalog_changes
+from .models import Server, ServerSpecification
+from .serializers import ImportServerSerializer
+
+SERVER_FIELDS = ["name", "mini_description", "price", "image", "is_active"]
+SPEC_FIELDS = ["description", "processor", "ram", "disk", "internet_speed"]
+FORMATS = ("csv", "jsonl")
+
+
+def read_csv(stream):
+    # Одна строка CSV - одна услуга и, если заполнен spec_external_id,
+    # одна её характеристика; строки одной услуги склеиваются импортёром.
+    for line, row in enumerate(csv.DictReader(stream), start=2):
+        record = {
+            name: row[name]
+            for name in ["external_id", *SERVER_FIELDS]
+            if row.get(name) not in (None, "")
+        }
+        if row.get("spec_external_id"):
+            spec = {name: row.get(name, "") for name in SPEC_FIELDS}
+            spec["external_id"] = row["spec_external_id"]
+            record["specifications"] = [spec]
+        yield line, record, None
+
+
+def read_jsonl(stream):
+    for line, raw in enumerate(stream, start=1):
+        if not raw.strip():
+            continue
+        try:
+            yield line, json.loads(raw), None
+        except ValueError as e:
+            yield line, None, {"non_field_errors": [f"Invalid JSON: {e}"]}
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+
+class CatalogImporter:
+    def __init__(self, batch_size=1000, on_error=None):
+        self.batch_size = batch_size
+        self.on_error = on_error
+        self.stats = {"rows": 0, "servers": 0, "specifications": 0, "errors": 0}
+
+    def run(self, rows):
+        # Фид читается потоково: в памяти держится только текущая пачка.
+        batch = {}
+        for line, record, errors in rows:
+            self.stats["rows"] += 1
+            if errors is None:
+                serializer = ImportServerSerializer(data=record)
+                if serializer.is_valid():
+                    self._merge(batch, serializer.validated_data)
+                    if len(batch) >= self.batch_size:
+                        self._flush(batch)
+                        batch = {}
+                    continue
+                errors = serializer.errors
+
+            self.stats["errors"] += 1
+            if self.on_error is not None:
+                external_id = None
+                if isinstance(record, dict):
+                    external_id = record.get("external_id")
+                self.on_error(line, external_id, errors)
+
+        if batch:
+            self._flush(batch)
+        # Кэши каталога сбрасываются один раз на весь импорт.
+        bump_catalog_version()
+        return self.stats
+
+    def _merge(self, batch, data):
+        specifications = data.pop("specifications")
+        entry = batch.setdefault(
+            data["external_id"], {"server": {}, "specifications": {}}
+        )
+        entry["server"].update(data)
+        for spec in specifications:
+            entry["specifications"][spec["external_id"]] = spec
+
+    def _flush(self, batch):
+        # Обновляются только колонки, пришедшие в фиде: у строк с разным
+        # набором колонок - отдельный upsert на каждый набор. Новые услуги
+        # получают значения по умолчанию модели.
+        groups = {}
+        for entry in batch.values():
+            fields = tuple(name for name in SERVER_FIELDS if name in entry["server"])
+            groups.setdefault(fields, []).append(Server(**entry["server"]))
+
+        with transaction.atomic():
+            for fields, servers in groups.items():
+                Server.objects.bulk_create(
+                    servers,
+                    update_conflicts=True,
+                    unique_fields=["external_id"],
+                    update_fields=fields,
+                )
+            servers = Server.objects.filter(external_id__in=batch)
+            # bulk_create обходит Server.save(), поэтому deactivated_at
+            # выставляется отдельными UPDATE на пачку.
+            servers.filter(is_active=True, deactivated_at__isnull=False).update(
+                deactivated_at=None
+            )
+            servers.filter(is_active=False, deactivated_at__isnull=True).update(
+                deactivated_at=timezone.now()
+            )
+            ids = dict(servers.values_list("external_id", "id"))
+
+            specifications = [
+                ServerSpecification(server_id=ids[external_id], **spec)
+                for external_id, entry in batch.items()
+                for spec in entry["specifications"].values()
+            ]
+            if specifications:
+                ServerSpecification.objects.bulk_create(
+                    specifications,
+                    update_conflicts=True,
+                    unique_fields=["server", "external_id"],
+                    update_fields=SPEC_FIELDS,
+                )
+            record_catalog_changes(ids.values())
+
+        self.stats["servers"] += len(batch)
+        self.stats["specifications"] += len(specifications)
@@ -0,0 +1,78 @@
+import base64
+import gzip
+
+import brotli
+from django.conf import settings
+from django.http import HttpResponse
+
+# Порядок - предпочтение сервера при равных q-значениях клиента.
+ENCODINGS = ("br", "gzip")
+
+
+def compress(content, encoding):
+    if encoding == "br":
+        return brotli.compress(content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(
+        content, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0
+    )
+
+
+def precompress(content):
+    if len(content) < settings.COMPRESSION_MIN_SIZE:
+        return {}
+    return {encoding: compress(content, encoding) for encoding in ENCODINGS}
+
+
+def pack(body, response_body=None):
+    # Запись кэша: тело и сжатые варианты ответа с ним (по умолчанию ответ -
+    # само тело). Сжатие выполняется один раз при заполнении кэша, а не на
+    # каждый запрос. Клиент Redis работает со строками, поэтому варианты
+    # хранятся в base64 отдельными строками "кодировка:данные"; в компактном
+    # JSON переводов строк нет.
+    content = (body if response_body is None else response_body).encode()
+    lines = [body]
+    for encoding, data in precompress(content).items():
+        lines.append(f"{encoding}:{base64.b64encode(data).decode()}")
+    return "\n".join(lines)
+
+
+def unpack(entry):
+    body, *lines = entry.split("\n")
+    variants = {}
+    for line in lines:
+        encoding, _, data = line.partition(":")
+        variants[encoding] = base64.b64decode(data)
+    return body, variants
+
+
+def entry_body(entry):
+    return entry.partition("\n")[0]
+
+
+def cached_json_response(body, precompressed=None):
+    # Ответ из готового JSON кэша; CompressionMiddleware возьмёт сжатый
+    # вариант из response.precompressed, остальное сожмёт сама.
+    response = HttpResponse(body, content_type="application/json")
+    response.precompressed = precompressed or {}
+    return response
+
+
+def negotiate(accept_encoding):
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    best = None
+    for encoding in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
@@ -0,0 +1,122 @@
+import logging
+
+import redis
+from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
+
+from .catalog import CATALOG_VERSION_KEY
+from .compression import pack
+from .models import ApplicationServer
+from .renderers import ORJSONRenderer
+from .serializers import ApplicationSerializer
+from .utils import redis_client
+
+logger = logging.getLogger(__name__)
+
+NO_DRAFT = "-"
+
+# Записывает тело, только если счётчик изменений черновика не сдвинулся
+# с момента, когда его прочитал писатель: ответ, собранный до чужой
+# правки корзины, не перезапишет более новый.
+STORE_SCRIPT = redis_client.register_script(
+    """
+local current = redis.call('GET', KEYS[2]) or '0'
+if current ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+)
+
+_renderer = ORJSONRenderer()
+
+
+def draft_key(user_id):
+    return f"draft:{user_id}"
+
+
+def draft_version_key(user_id):
+    return f"draft:{user_id}:version"
+
+
+def get_cached_draft(user_id):
+    # Возвращает (попадание, запись compression.pack с телом ответа или
+    # None, если черновика нет, счётчик изменений черновика для store_draft
+    # при промахе). Версия
+    # каталога и черновик читаются одним MGET: после правки услуг
+    # закэшированная корзина с устаревшими данными считается промахом.
+    try:
+        version, cached, draft_version = redis_client.mget(
+            CATALOG_VERSION_KEY, draft_key(user_id), draft_version_key(user_id)
+        )
+    except redis.RedisError:
+        logger.warning("Draft cache is unavailable", exc_info=True)
+        return False, None, None
+
+    draft_version = draft_version or "0"
+    if cached is None:
+        return False, None, draft_version
+    cached_version, _, entry = cached.partition(":")
+    if cached_version != (version or "0"):
+        return False, None, draft_version
+    return True, (None if entry == NO_DRAFT else entry), draft_version
+
+
+def _bump(user_id):
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.incr(draft_version_key(user_id))
+    pipe.expire(draft_version_key(user_id), settings.DRAFT_CACHE_SECONDS)
+    pipe.delete(draft_key(user_id))
+    draft_version, _, _ = pipe.execute()
+    return str(draft_version)
+
+
+def store_draft(user_id, application, draft_version=None):
+    # Без draft_version вызов считается правкой корзины (после коммита):
+    # счётчик изменений увеличивается, и параллельные заполнения кэша
+    # по более старым данным не запишутся. Версии читаются до сериализации:
+    # если данные поменяются в процессе, запись будет отброшена, а не
+    # сохранится устаревшей.
+    try:
+        if draft_version is None:
+            draft_version = _bump(user_id)
+        version = redis_client.get(CATALOG_VERSION_KEY) or "0"
+    except redis.RedisError:
+        logger.warning("Draft cache is unavailable", exc_info=True)
+        version = None
+
+    entry = None
+    if application is not None:
+        prefetch_related_objects(
+            [application],
+            Prefetch(
+                "servers",
+                queryset=ApplicationServer.objects.select_related(
+                    "server", "archived_server"
+                ),
+            ),
+        )
+        data = ApplicationSerializer(application).data
+        entry = pack(_renderer.render({"status": "success", "data": data}).decode())
+
+    if version is not None:
+        try:
+            STORE_SCRIPT(
+                keys=[draft_key(user_id), draft_version_key(user_id)],
+                args=[
+                    draft_version,
+                    f"{version}:{entry or NO_DRAFT}",
+                    settings.DRAFT_CACHE_SECONDS,
+                ],
+            )
+        except redis.RedisError:
+            logger.warning("Failed to cache draft for user %s", user_id, exc_info=True)
+    return entry
+
+
+def invalidate_draft(user_id):
+    try:
+        _bump(user_id)
+    except redis.RedisError:
+        logger.warning("Failed to invalidate draft for user %s", user_id, exc_info=True)
@@ -0,0 +1,94 @@
+import asyncio
+import json
+import logging
+
+import redis
+from django.conf import settings
+
+from .jobs import enqueue, job
+from .utils import get_async_redis_client, redis_client
+
+logger = logging.getLogger(__name__)
+
+MODERATORS_CHANNEL = "app_events:moderators"
+
+
+def user_channel(user_id):
+    return f"app_events:user:{user_id}"
+
+
+def publish_status_change(application):
+    payload = json.dumps(
+        {
+            "application": application.pk,
+            "status": application.status,
+            "updated_at": application.updated_at.isoformat(),
+        }
+    )
+    # Push-уведомление не должно задерживать и тем более ломать смену
+    # статуса: публикация с повторами уходит в фоновую задачу.
+    enqueue(send_status_change, application.user_creator_id, payload)
+
+
+@job
+def send_status_change(user_id, payload):
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.publish(user_channel(user_id), payload)
+    pipe.publish(MODERATORS_CHANNEL, payload)
+    pipe.execute()
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def stream_status_events(user):
+    channels = [user_channel(user.pk)]
+    if user.is_staff or user.is_superuser:
+        channels.append(MODERATORS_CHANNEL)
+
+    client = get_async_redis_client()
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(*channels)
+
+    # Очередь на соединение ограничена: медленный клиент теряет самые старые
+    # события и получает "resync", а не раздувает память процесса.
+    queue = asyncio.Queue(maxsize=settings.APP_EVENTS_QUEUE_SIZE)
+    state = {"dropped": False}
+
+    async def reader():
+        async for message in pubsub.listen():
+            if message["type"] != "message":
+                continue
+            if queue.full():
+                queue.get_nowait()
+                state["dropped"] = True
+            queue.put_nowait(message["data"])
+
+    reader_task = asyncio.create_task(reader())
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                data = await asyncio.wait_for(
+                    queue.get(), timeout=settings.APP_EVENTS_HEARTBEAT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                if reader_task.done():
+                    break
+                yield ": keepalive\n\n"
+                continue
+
+            if state["dropped"]:
+                state["dropped"] = False
+                yield _sse("resync", "{}")
+            yield _sse("status", data)
+    finally:
+        reader_task.cancel()
+        await asyncio.gather(reader_task, return_exceptions=True)
+        try:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+            await client.aclose()
+        except redis.RedisError:
+            pass
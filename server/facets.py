@@ -0,0 +1,217 @@
+import json
+import logging
+
+import redis
+from django.conf import settings
+from django.db.models import Case, CharField, Count, F, Q, Value, When
+
+from .catalog import CATALOG_VERSION_KEY, latest_catalog_change
+from .models import CatalogChange, Server, ServerSpecification
+from .routers import primary_reads
+from .utils import redis_client
+
+logger = logging.getLogger(__name__)
+
+FACETS_KEY = "catalog:facets"
+# Состояние для инкрементального пересчёта: номер последнего учтённого
+# изменения каталога, счётчики значений и вклад каждой услуги в них.
+FACETS_SEQ_KEY = "catalog:facets:seq"
+FACETS_COUNTS_KEY = "catalog:facets:counts"
+FACETS_MEMBERS_KEY = "catalog:facets:members"
+FACETS_LOCK_KEY = "catalog:facets:lock"
+SPEC_FACETS = ("processor", "ram", "disk")
+
+
+def _price_buckets():
+    bounds = settings.FACET_PRICE_BUCKETS
+    whens = []
+    lower = 0
+    for upper in bounds:
+        whens.append(When(price__lt=upper, then=Value(f"{lower}-{upper}")))
+        lower = upper
+    return Case(*whens, default=Value(f"{lower}+"), output_field=CharField())
+
+
+def price_bucket(price):
+    # То же разбиение, что и _price_buckets(), но для одной цены.
+    lower = 0
+    for upper in settings.FACET_PRICE_BUCKETS:
+        if price < upper:
+            return f"{lower}-{upper}"
+        lower = upper
+    return f"{lower}+"
+
+
+def _grouped(queryset, facet, value, count):
+    return (
+        queryset.annotate(facet=Value(facet, output_field=CharField()), value=value)
+        .values("facet", "value")
+        .annotate(count=count)
+        .order_by()
+    )
+
+
+def compute_facets():
+    # Все фасеты считаются одним запросом: GROUP BY по каждому измерению,
+    # склеенные через UNION ALL.
+    price = _grouped(Server.active.all(), "price", _price_buckets(), Count("id"))
+    specs = ServerSpecification.objects.filter(server__is_active=True)
+    parts = [
+        _grouped(specs, name, F(name), Count("server", distinct=True))
+        for name in SPEC_FACETS
+    ]
+
+    facets = {name: [] for name in ("price", *SPEC_FACETS)}
+    for row in price.union(*parts, all=True):
+        facets[row["facet"]].append({"value": row["value"], "count": row["count"]})
+    return _format(facets)
+
+
+def _format(facets):
+    for values in facets.values():
+        values.sort(key=lambda item: (-item["count"], item["value"]))
+    return facets
+
+
+def server_facets(server_ids=None):
+    # {id услуги: ["[facet, value]", ...]} для активных услуг; значение
+    # характеристики учитывается у услуги один раз, как Count(distinct).
+    servers = Server.active.all()
+    specs = ServerSpecification.objects.filter(server__is_active=True)
+    if server_ids is not None:
+        servers = servers.filter(pk__in=server_ids)
+        specs = specs.filter(server_id__in=server_ids)
+
+    members = {
+        server_id: {json.dumps(["price", price_bucket(price)])}
+        for server_id, price in servers.values_list("id", "price")
+    }
+    for row in specs.values("server_id", *SPEC_FACETS):
+        fields = members.get(row["server_id"])
+        if fields is not None:
+            fields.update(json.dumps([name, row[name]]) for name in SPEC_FACETS)
+    return {server_id: sorted(fields) for server_id, fields in members.items()}
+
+
+def _rebuild(seq):
+    members = server_facets()
+    counts = {}
+    for fields in members.values():
+        for field in fields:
+            counts[field] = counts.get(field, 0) + 1
+
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(FACETS_COUNTS_KEY, FACETS_MEMBERS_KEY)
+    if counts:
+        pipe.hset(FACETS_COUNTS_KEY, mapping=counts)
+        pipe.hset(
+            FACETS_MEMBERS_KEY,
+            mapping={
+                server_id: json.dumps(fields) for server_id, fields in members.items()
+            },
+        )
+    pipe.set(FACETS_SEQ_KEY, seq)
+    pipe.execute()
+
+
+def _apply_changes(server_ids, seq):
+    # Вклад изменившихся услуг вычитается по сохранённому и прибавляется
+    # по текущему состоянию в базе; повторная обработка того же изменения
+    # ничего не меняет.
+    server_ids = sorted(server_ids)
+    previous = redis_client.hmget(FACETS_MEMBERS_KEY, server_ids)
+    current = server_facets(server_ids)
+
+    deltas = {}
+    pipe = redis_client.pipeline(transaction=True)
+    for server_id, old in zip(server_ids, previous):
+        old = set(json.loads(old)) if old else set()
+        new = current.get(server_id)
+        for field in old - set(new or ()):
+            deltas[field] = deltas.get(field, 0) - 1
+        for field in set(new or ()) - old:
+            deltas[field] = deltas.get(field, 0) + 1
+        if new:
+            pipe.hset(FACETS_MEMBERS_KEY, server_id, json.dumps(new))
+        else:
+            pipe.hdel(FACETS_MEMBERS_KEY, server_id)
+    for field, delta in deltas.items():
+        if delta:
+            pipe.hincrby(FACETS_COUNTS_KEY, field, delta)
+    pipe.set(FACETS_SEQ_KEY, seq)
+    pipe.execute()
+
+
+def refresh_facets(version):
+    # Вызывается под FACETS_LOCK_KEY. Обычно пересчитываются только услуги
+    # из журнала CatalogChange после последнего учтённого номера; полный
+    # пересчёт - при первом запуске, потере состояния в Redis, очищенном
+    # журнале или слишком большой пачке изменений.
+    seq, has_members = (
+        redis_client.pipeline(transaction=False)
+        .get(FACETS_SEQ_KEY)
+        .exists(FACETS_MEMBERS_KEY)
+        .execute()
+    )
+    latest = latest_catalog_change()
+    server_ids = None
+    if seq is not None and has_members:
+        seq = int(seq)
+        oldest = (
+            CatalogChange.objects.order_by("id").values_list("id", flat=True).first()
+        )
+        if oldest is None or seq >= oldest - 1:
+            server_ids = set(
+                CatalogChange.objects.filter(id__gt=seq, id__lte=latest)
+                .values_list("server_id", flat=True)
+                .distinct()[: settings.FACET_INCREMENTAL_MAX_SERVERS + 1]
+            )
+    if server_ids is None or len(server_ids) > settings.FACET_INCREMENTAL_MAX_SERVERS:
+        _rebuild(latest)
+    elif server_ids:
+        _apply_changes(server_ids, latest)
+
+    facets = {name: [] for name in ("price", *SPEC_FACETS)}
+    for field, count in redis_client.hgetall(FACETS_COUNTS_KEY).items():
+        if int(count) > 0:
+            name, value = json.loads(field)
+            facets[name].append({"value": value, "count": int(count)})
+    body = json.dumps({"version": version, "facets": _format(facets)})
+    redis_client.set(FACETS_KEY, body, ex=settings.FACET_CACHE_SECONDS)
+    return body
+
+
+def get_facets():
+    # Кэш привязан к версии каталога: любая запись в Server или
+    # ServerSpecification увеличивает версию, и первый же запрос после неё
+    # обновляет фасеты. Версия и кэш читаются одним MGET. Возвращается
+    # готовый JSON {"version": ..., "facets": ...}.
+    try:
+        version, cached = redis_client.mget(CATALOG_VERSION_KEY, FACETS_KEY)
+    except redis.RedisError:
+        return json.dumps({"version": None, "facets": compute_facets()})
+
+    version = int(version or 0)
+    if cached and json.loads(cached)["version"] == version:
+        return cached
+
+    # Обновляет один процесс; остальные, не дождавшись, считают фасеты
+    # запросом сами и в кэш не пишут.
+    lock = redis_client.lock(
+        FACETS_LOCK_KEY,
+        timeout=settings.FACET_REFRESH_LOCK_SECONDS,
+        blocking_timeout=settings.FACET_REFRESH_WAIT_SECONDS,
+    )
+    try:
+        if lock.acquire():
+            try:
+                cached = redis_client.get(FACETS_KEY)
+                if cached and json.loads(cached)["version"] == version:
+                    return cached
+                with primary_reads():
+                    return refresh_facets(version)
+            finally:
+                lock.release()
+    except redis.RedisError:
+        logger.warning("Failed to refresh cached facets", exc_info=True)
+    return json.dumps({"version": version, "facets": compute_facets()})
@@ -0,0 +1,10 @@
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    # Алгоритм остаётся "argon2": хэши с другими параметрами проверяются этим
+    # же классом, а must_update() прозрачно перехэширует их при входе.
+    time_cost = settings.ARGON2_TIME_COST
+    memory_cost = settings.ARGON2_MEMORY_COST
+    parallelism = settings.ARGON2_PARALLELISM
@@ -0,0 +1,161 @@
+import functools
+import hashlib
+import json
+import logging
+import time
+
+import redis
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .renderers import ORJSONRenderer
+from .utils import redis_client
+
+logger = logging.getLogger(__name__)
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+POLL_SECONDS = 0.05
+
+# Либо возвращает уже сохранённое состояние ключа, либо атомарно занимает
+# его под выполняющийся запрос: два параллельных повтора не выполнятся оба.
+CLAIM_SCRIPT = redis_client.register_script(
+    """
+local current = redis.call('GET', KEYS[1])
+if current then
+    return current
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return false
+"""
+)
+
+_renderer = ORJSONRenderer()
+
+
+class FingerprintEncoder(JSONEncoder):
+    def default(self, obj):
+        # Загруженные файлы (multipart в ServerList.post) сравниваются по
+        # имени и размеру, без чтения содержимого.
+        if isinstance(obj, UploadedFile):
+            return [obj.name, obj.size]
+        return super().default(obj)
+
+
+def fingerprint(request):
+    body = json.dumps(request.data, cls=FingerprintEncoder, sort_keys=True)
+    return hashlib.sha256(
+        f"{request.method} {request.path} {body}".encode()
+    ).hexdigest()
+
+
+def serialize_response(response):
+    if isinstance(response, Response):
+        return {
+            "status": response.status_code,
+            "data": _renderer.render(response.data).decode(),
+        }
+    return {
+        "status": response.status_code,
+        "content": response.content.decode(),
+        "content_type": response["Content-Type"],
+    }
+
+
+def replay_response(stored):
+    if "data" in stored:
+        response = Response(json.loads(stored["data"]), status=stored["status"])
+    else:
+        response = HttpResponse(
+            stored["content"],
+            status=stored["status"],
+            content_type=stored["content_type"],
+        )
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(handler):
+    # Повтор запроса с тем же Idempotency-Key получает сохранённый первый
+    # ответ, а не выполняет запись ещё раз. Ключ привязан к пользователю,
+    # методу и пути; 5xx не сохраняются, чтобы повтор мог выполниться заново.
+    @functools.wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return handler(self, request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"detail": f"{HEADER} must be 1-{MAX_KEY_LENGTH} characters"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        user_id = request.user.pk if request.user.is_authenticated else "anon"
+        redis_key = f"idempotency:{user_id}:{request.method}:{request.path}:{key}"
+        request_fingerprint = fingerprint(request)
+        pending = json.dumps({"state": "pending", "fingerprint": request_fingerprint})
+
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        try:
+            while True:
+                current = CLAIM_SCRIPT(
+                    keys=[redis_key],
+                    args=[pending, settings.IDEMPOTENCY_LOCK_SECONDS * 1000],
+                )
+                if current is None:
+                    break
+
+                current = json.loads(current)
+                if current["fingerprint"] != request_fingerprint:
+                    return Response(
+                        {"detail": f"{HEADER} was already used with another request"},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    )
+                if current["state"] == "done":
+                    return replay_response(current["response"])
+                # Первый запрос ещё выполняется: ждём его ответ, а не дублируем.
+                if time.monotonic() >= deadline:
+                    return Response(
+                        {"detail": "A request with this key is still in progress"},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                time.sleep(POLL_SECONDS)
+        except redis.RedisError:
+            logger.warning("Idempotency store is unavailable", exc_info=True)
+            return handler(self, request, *args, **kwargs)
+
+        try:
+            response = handler(self, request, *args, **kwargs)
+        except Exception:
+            _forget(redis_key)
+            raise
+
+        if response.status_code >= 500:
+            _forget(redis_key)
+            return response
+
+        done = {
+            "state": "done",
+            "fingerprint": request_fingerprint,
+            "response": serialize_response(response),
+        }
+        try:
+            redis_client.set(
+                redis_key, json.dumps(done), ex=settings.IDEMPOTENCY_TTL_SECONDS
+            )
+        except redis.RedisError:
+            logger.warning("Failed to store idempotent response", exc_info=True)
+        return response
+
+    return wrapper
+
+
+def _forget(redis_key):
+    try:
+        redis_client.delete(redis_key)
+    except redis.RedisError:
+        logger.warning("Failed to release idempotency key", exc_info=True)
@@ -0,0 +1,254 @@
+import json
+import logging
+import random
+import time
+import traceback
+import uuid
+
+import redis
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .utils import redis_client
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "jobs:queue"
+DELAYED_KEY = "jobs:delayed"
+DEAD_KEY = "jobs:dead"
+# Воркер забирает задачу из очереди в свой список jobs:processing:<id> и
+# удаляет её оттуда только после выполнения или переноса в повтор/dead
+# letters. Живые воркеры продлевают jobs:worker:<id>.
+WORKERS_KEY = "jobs:workers"
+PROCESSING_PREFIX = "jobs:processing:"
+HEARTBEAT_PREFIX = "jobs:worker:"
+
+# Переносит созревшие повторы из отложенного множества в очередь; делается
+# одним скриптом, чтобы два воркера не забрали один и тот же повтор.
+PROMOTE_SCRIPT = redis_client.register_script(
+    """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(due) do
+    redis.call('ZREM', KEYS[1], member)
+    redis.call('LPUSH', KEYS[2], member)
+end
+return #due
+"""
+)
+
+
+# Возвращает в очередь задачи воркеров, переставших продлевать метку
+# (процесс упал или был убит посреди задачи).
+REQUEUE_STALLED_SCRIPT = redis_client.register_script(
+    """
+local moved = 0
+for _, worker in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    if redis.call('EXISTS', ARGV[2] .. worker) == 0 then
+        while redis.call('LMOVE', ARGV[1] .. worker, KEYS[2], 'RIGHT', 'RIGHT') do
+            moved = moved + 1
+        end
+        redis.call('SREM', KEYS[1], worker)
+    end
+end
+return moved
+"""
+)
+
+
+def job(func=None, *, max_attempts=None):
+    # Помечает функцию как задачу: воркер выполняет только помеченные функции,
+    # найденные по полному пути модуля.
+    def decorate(func):
+        func.job_name = f"{func.__module__}.{func.__qualname__}"
+        func.job_max_attempts = max_attempts or settings.JOBS_MAX_ATTEMPTS
+        return func
+
+    return decorate(func) if func is not None else decorate
+
+
+def enqueue(func, *args):
+    # Аргументы должны сериализоваться в JSON. Задача уходит в очередь после
+    # коммита транзакции, чтобы воркер не увидел незафиксированные данные.
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: _run_eager(func, args))
+        return
+
+    payload = json.dumps(
+        {
+            "id": uuid.uuid4().hex,
+            "name": func.job_name,
+            "args": list(args),
+            "attempts": 0,
+            "enqueued_at": timezone.now().isoformat(),
+        }
+    )
+    transaction.on_commit(lambda: _push(func.job_name, payload))
+
+
+def _push(name, payload):
+    try:
+        redis_client.lpush(QUEUE_KEY, payload)
+    except redis.RedisError:
+        # Задачи - второстепенные побочные эффекты: запрос не должен падать
+        # из-за недоступной очереди.
+        logger.warning("Failed to enqueue job %s", name, exc_info=True)
+
+
+def _run_eager(func, args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Job %s failed", func.job_name)
+
+
+def backoff(attempts):
+    delay = min(
+        settings.JOBS_RETRY_MAX_SECONDS,
+        settings.JOBS_RETRY_BASE_SECONDS * 2 ** (attempts - 1),
+    )
+    return random.uniform(delay / 2, delay)
+
+
+def promote_due(limit=100):
+    return PROMOTE_SCRIPT(keys=[DELAYED_KEY, QUEUE_KEY], args=[time.time(), limit])
+
+
+def resolve(name):
+    try:
+        func = import_string(name)
+    except ImportError:
+        return None
+    if getattr(func, "job_name", None) != name:
+        return None
+    return func
+
+
+def run_job(payload):
+    # Ошибки Redis при переносе в повтор или dead letters пробрасываются:
+    # work() оставит задачу в очереди.
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        logger.error("Dropping invalid job payload %r", payload)
+        return False
+    func = resolve(data["name"])
+    if func is None:
+        data["attempts"] += 1
+        _bury(data, f"{data['name']} is not a registered job")
+        return False
+
+    close_old_connections()
+    try:
+        func(*data["args"])
+        return True
+    except Exception as e:
+        data["attempts"] += 1
+        if data["attempts"] < func.job_max_attempts:
+            delay = backoff(data["attempts"])
+            logger.warning(
+                "Job %s failed, retry %s in %.1fs",
+                data["name"],
+                data["attempts"],
+                delay,
+                exc_info=True,
+            )
+            data["error"] = f"{type(e).__name__}: {e}"
+            redis_client.zadd(DELAYED_KEY, {json.dumps(data): time.time() + delay})
+        else:
+            logger.error("Job %s moved to dead letters", data["name"], exc_info=True)
+            _bury(data, traceback.format_exc())
+        return False
+    finally:
+        close_old_connections()
+
+
+def _bury(data, error):
+    data["error"] = error
+    data["failed_at"] = timezone.now().isoformat()
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.lpush(DEAD_KEY, json.dumps(data))
+    pipe.ltrim(DEAD_KEY, 0, settings.JOBS_DEAD_LETTER_MAX - 1)
+    pipe.execute()
+
+
+def requeue_stalled():
+    return REQUEUE_STALLED_SCRIPT(
+        keys=[WORKERS_KEY, QUEUE_KEY], args=[PROCESSING_PREFIX, HEARTBEAT_PREFIX]
+    )
+
+
+def _heartbeat(worker_id):
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.sadd(WORKERS_KEY, worker_id)
+    pipe.set(HEARTBEAT_PREFIX + worker_id, 1, ex=settings.JOBS_WORKER_TIMEOUT_SECONDS)
+    pipe.execute()
+
+
+def _restore(processing):
+    # Задачи, которые не удалось передать дальше (Redis был недоступен),
+    # возвращаются в очередь, а не остаются в списке воркера.
+    while redis_client.lmove(processing, QUEUE_KEY, "RIGHT", "RIGHT") is not None:
+        pass
+
+
+def work(stop, burst=False, poll_seconds=1):
+    # Цикл одного воркера; stop - threading.Event для мягкой остановки.
+    # Задача дольше JOBS_WORKER_TIMEOUT_SECONDS может быть выполнена повторно.
+    worker_id = uuid.uuid4().hex
+    processing = PROCESSING_PREFIX + worker_id
+    try:
+        while not stop.is_set():
+            try:
+                _heartbeat(worker_id)
+                _restore(processing)
+                promote_due()
+                requeue_stalled()
+                payload = redis_client.blmove(
+                    QUEUE_KEY, processing, poll_seconds, "RIGHT", "LEFT"
+                )
+            except redis.RedisError:
+                logger.warning("Job queue is unavailable", exc_info=True)
+                stop.wait(poll_seconds)
+                continue
+
+            if payload is None:
+                # В режиме burst воркер выходит, когда очередь пуста; отложенные
+                # повторы дождутся следующего запуска.
+                if burst:
+                    return
+                continue
+
+            try:
+                run_job(payload)
+                redis_client.lrem(processing, 1, payload)
+            except redis.RedisError:
+                logger.error(
+                    "Failed to hand off job, it will be requeued", exc_info=True
+                )
+                stop.wait(poll_seconds)
+    finally:
+        try:
+            _restore(processing)
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.delete(HEARTBEAT_PREFIX + worker_id)
+            pipe.srem(WORKERS_KEY, worker_id)
+            pipe.execute()
+        except redis.RedisError:
+            logger.warning("Failed to unregister job worker", exc_info=True)
+
+
+def requeue_dead():
+    # Возвращает задачи из dead letters в очередь со сброшенным счётчиком попыток.
+    moved = 0
+    while True:
+        payload = redis_client.rpop(DEAD_KEY)
+        if payload is None:
+            return moved
+        data = json.loads(payload)
+        data["attempts"] = 0
+        data.pop("error", None)
+        data.pop("failed_at", None)
+        redis_client.lpush(QUEUE_KEY, json.dumps(data))
+        moved += 1
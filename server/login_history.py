@@ -0,0 +1,87 @@
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .jobs import enqueue, job
+from .utils import redis_client
+
+GLOBAL_KEY = "login_history:all"
+BULK_CHUNK_SIZE = 500
+
+
+def user_key(username):
+    return f"login_history:{username}"
+
+
+def _retention_seconds():
+    return settings.LOGIN_HISTORY_RETENTION_DAYS * 24 * 60 * 60
+
+
+def _write(pipe, username, moment, now):
+    # Одна запись = два ZADD и обрезка по лимиту и сроку хранения; всё уходит
+    # в конвейер, поэтому на вход тратится один сетевой round trip.
+    cutoff = now.timestamp() - _retention_seconds()
+    score = moment.timestamp()
+    key = user_key(username)
+
+    pipe.zadd(key, {moment.isoformat(): score})
+    pipe.zremrangebyrank(key, 0, -settings.LOGIN_HISTORY_PER_USER - 1)
+    pipe.zremrangebyscore(key, "-inf", cutoff)
+    pipe.expire(key, _retention_seconds())
+
+    pipe.zadd(GLOBAL_KEY, {f"{username}|{moment.isoformat()}": score})
+    pipe.zremrangebyscore(GLOBAL_KEY, "-inf", cutoff)
+
+
+@job
+def store_login(username, logged_in_at):
+    record_logins([(username, parse_datetime(logged_in_at))])
+
+
+def record_login(username, moment=None):
+    # Время входа фиксируется в запросе, а запись в историю уходит в фоновую
+    # задачу; ошибки Redis там приводят к повтору, а не к ошибке входа.
+    enqueue(store_login, username, (moment or timezone.now()).isoformat())
+
+
+def record_logins(entries):
+    now = timezone.now()
+    pipe = redis_client.pipeline(transaction=False)
+    for index, (username, moment) in enumerate(entries, start=1):
+        _write(pipe, username, moment, now)
+        if index % BULK_CHUNK_SIZE == 0:
+            pipe.execute()
+    pipe.zremrangebyrank(GLOBAL_KEY, 0, -settings.LOGIN_HISTORY_GLOBAL_MAX - 1)
+    pipe.execute()
+
+
+def _bounds(since, until):
+    return (
+        until.timestamp() if until else "+inf",
+        since.timestamp() if since else "-inf",
+    )
+
+
+def _to_datetime(score):
+    return datetime.datetime.fromtimestamp(score, tz=datetime.timezone.utc)
+
+
+def recent_logins(username, limit, since=None, until=None):
+    upper, lower = _bounds(since, until)
+    rows = redis_client.zrevrangebyscore(
+        user_key(username), upper, lower, start=0, num=limit, withscores=True
+    )
+    return [_to_datetime(score) for _, score in rows]
+
+
+def logins_between(limit, since=None, until=None):
+    upper, lower = _bounds(since, until)
+    rows = redis_client.zrevrangebyscore(
+        GLOBAL_KEY, upper, lower, start=0, num=limit, withscores=True
+    )
+    return [
+        {"username": member.rsplit("|", 1)[0], "logged_in_at": _to_datetime(score)}
+        for member, score in rows
+    ]
@@ -0,0 +1,77 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from server.models import (
+    Application,
+    ApplicationServer,
+    ApplicationStatus,
+    ArchivedApplication,
+)
+from server.serializers import ApplicationSerializer
+
+FINISHED_STATUSES = [
+    ApplicationStatus.COMPLETED,
+    ApplicationStatus.REJECTED,
+    ApplicationStatus.DELETED,
+]
+
+
+class Command(BaseCommand):
+    help = "Переносит старые завершённые заявки в архивную таблицу"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-days", type=int, default=365)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=options["older_than_days"])
+        archived = 0
+
+        while True:
+            # Короткие транзакции на пачку: заявки, которые сейчас кто-то
+            # держит, пропускаются и попадут в следующий запуск.
+            with transaction.atomic():
+                applications = list(
+                    Application.objects.select_for_update(skip_locked=True)
+                    .filter(status__in=FINISHED_STATUSES, created_at__lt=cutoff)
+                    .order_by("created_at", "id")[: options["batch_size"]]
+                )
+                if not applications:
+                    break
+
+                ids = [application.pk for application in applications]
+                servers = {
+                    item["pk"]: item["servers"]
+                    for item in ApplicationSerializer(
+                        Application.objects.filter(pk__in=ids).prefetch_related(
+                            "servers__server", "servers__archived_server"
+                        ),
+                        many=True,
+                    ).data
+                }
+
+                ArchivedApplication.objects.bulk_create(
+                    [
+                        ArchivedApplication(
+                            id=application.pk,
+                            status=application.status,
+                            created_at=application.created_at,
+                            updated_at=application.updated_at,
+                            total_price=application.total_price,
+                            user_creator_id=application.user_creator_id,
+                            user_moderator_id=application.user_moderator_id,
+                            servers=servers[application.pk],
+                        )
+                        for application in applications
+                    ]
+                )
+                ApplicationServer.objects.filter(application_id__in=ids).delete()
+                Application.objects.filter(pk__in=ids).delete()
+
+            archived += len(applications)
+            self.stdout.write(f"Archived {archived} applications")
+
+        self.stdout.write(self.style.SUCCESS(f"Done, archived {archived} applications"))
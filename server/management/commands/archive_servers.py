@@ -0,0 +1,72 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from server.models import (
+    ApplicationServer,
+    ArchivedServer,
+    Server,
+    ServerSpecification,
+)
+
+SPEC_FIELDS = ("id", "description", "processor", "ram", "disk", "internet_speed")
+
+
+class Command(BaseCommand):
+    help = "Переносит давно неактивные услуги в архивную таблицу"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--inactive-days", type=int, default=180)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=options["inactive_days"])
+        archived = 0
+
+        while True:
+            # Каждая пачка - отдельная короткая транзакция, поэтому блокировки
+            # держатся только на время переноса batch-size строк.
+            with transaction.atomic():
+                servers = list(
+                    Server.objects.select_for_update(skip_locked=True)
+                    .filter(is_active=False, deactivated_at__lt=cutoff)
+                    .order_by("deactivated_at", "id")[: options["batch_size"]]
+                )
+                if not servers:
+                    break
+
+                ids = [server.pk for server in servers]
+                specifications = {}
+                for spec in ServerSpecification.objects.filter(
+                    server_id__in=ids
+                ).values("server_id", *SPEC_FIELDS):
+                    specifications.setdefault(spec.pop("server_id"), []).append(spec)
+
+                ArchivedServer.objects.bulk_create(
+                    [
+                        ArchivedServer(
+                            id=server.pk,
+                            name=server.name,
+                            image=server.image.name,
+                            mini_description=server.mini_description,
+                            price=server.price,
+                            specifications=specifications.get(server.pk, []),
+                            deactivated_at=server.deactivated_at,
+                        )
+                        for server in servers
+                    ]
+                )
+                # История заявок сохраняется: строки ApplicationServer
+                # переключаются на архивную запись одним UPDATE.
+                ApplicationServer.objects.filter(server_id__in=ids).update(
+                    archived_server_id=F("server_id"), server=None
+                )
+                Server.objects.filter(pk__in=ids).delete()
+
+            archived += len(servers)
+            self.stdout.write(f"Archived {archived} servers")
+
+        self.stdout.write(self.style.SUCCESS(f"Done, archived {archived} servers"))
@@ -0,0 +1,30 @@
+import time
+
+from django.contrib.auth.hashers import check_password, get_hasher, make_password
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Измеряет число проверок пароля в секунду на одно ядро"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        hasher = get_hasher()
+        encoded = make_password("benchmark-password")
+
+        checks = 0
+        started = time.perf_counter()
+        deadline = started + options["seconds"]
+        while time.perf_counter() < deadline:
+            check_password("benchmark-password", encoded)
+            checks += 1
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"hasher={hasher.algorithm} {hasher.safe_summary(encoded)}")
+        self.stdout.write(
+            f"checks={checks} "
+            f"per_check={elapsed / checks * 1000:.1f}ms "
+            f"logins_per_sec_per_core={checks / elapsed:.1f}"
+        )
@@ -0,0 +1,52 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from server.throttling import SearchIPThrottle
+from server.utils import redis_client
+
+
+class Command(BaseCommand):
+    help = "Измеряет накладные расходы троттлинга на один запрос"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=10_000)
+        parser.add_argument("--clients", type=int, default=100)
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        throttle = SearchIPThrottle()
+        requests = [
+            Request(
+                factory.get(
+                    "/api/servers/",
+                    {"query": "vps"},
+                    REMOTE_ADDR=f"10.0.{index // 256}.{index % 256}",
+                )
+            )
+            for index in range(options["clients"])
+        ]
+
+        redis_client.ping()
+        timings = []
+        for index in range(options["requests"]):
+            request = requests[index % len(requests)]
+            started = time.perf_counter()
+            throttle.allow_request(request, None)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        p99 = timings[int(len(timings) * 0.99) - 1]
+        self.stdout.write(
+            f"requests={len(timings)} "
+            f"mean={statistics.mean(timings):.3f}ms "
+            f"p50={statistics.median(timings):.3f}ms "
+            f"p99={p99:.3f}ms"
+        )
+        if p99 >= 1:
+            self.stdout.write(self.style.WARNING("p99 overhead is above 1ms"))
+        else:
+            self.stdout.write(self.style.SUCCESS("p99 overhead is below 1ms"))
@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from server.recommendations import rebuild_recommendations
+
+
+class Command(BaseCommand):
+    help = "Пересобирает рекомендации 'часто арендуют вместе' по всем заявкам"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.RECOMMENDATIONS_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        stats = rebuild_recommendations(options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"servers={stats['servers']} pairs={stats['pairs']} "
+                f"elapsed={time.perf_counter() - started:.1f}s"
+            )
+        )
@@ -0,0 +1,43 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from server.catalog_import import FORMATS, READERS, CatalogImporter
+
+
+class Command(BaseCommand):
+    help = "Импортирует каталог услуг из CSV или JSON Lines (upsert по external_id)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=FORMATS)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--errors-file", default="import_errors.csv")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or path.rsplit(".", 1)[-1].lower()
+        if fmt not in READERS:
+            raise CommandError(f"Unknown format '{fmt}', use --format")
+
+        with open(path, encoding="utf-8", newline="") as stream, open(
+            options["errors_file"], "w", encoding="utf-8", newline=""
+        ) as errors_file:
+            writer = csv.writer(errors_file)
+            writer.writerow(["line", "external_id", "errors"])
+
+            def on_error(line, external_id, errors):
+                writer.writerow([line, external_id or "", json.dumps(errors)])
+
+            importer = CatalogImporter(options["batch_size"], on_error)
+            stats = importer.run(READERS[fmt](stream))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"rows={stats['rows']} servers={stats['servers']} "
+                f"specifications={stats['specifications']} errors={stats['errors']}"
+            )
+        )
+        if stats["errors"]:
+            self.stdout.write(f"Row errors written to {options['errors_file']}")
@@ -0,0 +1,45 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from server.login_history import record_logins
+from server.utils import redis_client
+
+LEGACY_PREFIX = "user_login:"
+
+
+class Command(BaseCommand):
+    help = "Переносит старые списки user_login:<username> в историю входов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        migrated_keys = 0
+        migrated_entries = 0
+
+        for key in redis_client.scan_iter(
+            match=f"{LEGACY_PREFIX}*", count=options["batch_size"]
+        ):
+            username = key[len(LEGACY_PREFIX) :]
+            entries = []
+            for value in redis_client.lrange(key, 0, -1):
+                try:
+                    moment = datetime.datetime.fromisoformat(value)
+                except ValueError:
+                    continue
+                if timezone.is_naive(moment):
+                    moment = timezone.make_aware(moment)
+                entries.append((username, moment))
+
+            record_logins(entries)
+            redis_client.delete(key)
+            migrated_keys += 1
+            migrated_entries += len(entries)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Migrated {migrated_entries} logins from {migrated_keys} keys"
+            )
+        )
@@ -0,0 +1,26 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from server.catalog import latest_catalog_change
+from server.models import CatalogChange
+
+
+class Command(BaseCommand):
+    help = "Удаляет старые записи журнала изменений каталога"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=settings.CATALOG_CHANGES_RETENTION_DAYS
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=options["days"])
+        # Последняя запись остаётся всегда: по ней servers/changes/ понимает,
+        # что журнал был очищен, и отвечает 410 на устаревший since.
+        deleted, _ = CatalogChange.objects.filter(
+            changed_at__lt=cutoff, id__lt=latest_catalog_change()
+        ).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} catalog changes"))
@@ -0,0 +1,23 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from server.outbox import relay_outbox
+
+
+class Command(BaseCommand):
+    help = "Переносит события смены статуса заявок из outbox в Redis Stream"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Выйти, когда outbox опустеет"
+        )
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+        relayed = relay_outbox(stop, once=options["once"])
+        self.stdout.write(f"relayed={relayed}")
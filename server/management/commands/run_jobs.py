@@ -0,0 +1,51 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from server.jobs import requeue_dead, work
+
+
+class Command(BaseCommand):
+    help = "Запускает воркер фоновых задач из очереди Redis"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency", type=int, default=settings.JOBS_CONCURRENCY
+        )
+        parser.add_argument(
+            "--burst", action="store_true", help="Выйти, когда очередь опустеет"
+        )
+        parser.add_argument(
+            "--requeue-dead",
+            action="store_true",
+            help="Вернуть задачи из dead letters в очередь и выйти",
+        )
+
+    def handle(self, *args, **options):
+        if options["requeue_dead"]:
+            self.stdout.write(f"requeued={requeue_dead()}")
+            return
+
+        stop = threading.Event()
+
+        def shutdown(signum, frame):
+            # Текущие задачи дорабатывают, новые из очереди не берутся.
+            stop.set()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        threads = [
+            threading.Thread(
+                target=work, args=(stop, options["burst"]), name=f"jobs-{index}"
+            )
+            for index in range(options["concurrency"])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f"workers={len(threads)} started")
+        for thread in threads:
+            thread.join()
+        self.stdout.write("workers stopped")
@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Холодный старт воркера: настройка Django и загрузка всех URL (а значит,
+# views, сериализаторов и моделей), как при первом запросе.
+BOOT_SCRIPT = (
+    "import django; django.setup(); "
+    "from django.urls import get_resolver; get_resolver().url_patterns"
+)
+
+
+def parse_importtime(stderr):
+    # Строки вида "import time:   self [us] | cumulative | imported package".
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|", 2)
+        if not self_us.strip().isdigit():
+            continue
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+class Command(BaseCommand):
+    help = "Показывает, какие импорты замедляют холодный старт приложения"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=20)
+
+    def handle(self, *args, **options):
+        env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", BOOT_SCRIPT],
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+
+        modules = parse_importtime(result.stderr)
+        packages = defaultdict(int)
+        for name, self_us, _ in modules:
+            packages[name.split(".")[0]] += self_us
+        total = sum(packages.values())
+
+        self.stdout.write(f"modules={len(modules)} total={total / 1000:.1f}ms")
+        self.stdout.write("\nПакеты (собственное время):")
+        for name, self_us in sorted(packages.items(), key=lambda x: -x[1])[
+            : options["top"]
+        ]:
+            self.stdout.write(f"  {self_us / 1000:8.1f}ms  {name}")
+
+        self.stdout.write("\nМодули (с учётом вложенных импортов):")
+        for name, _, cumulative_us in sorted(modules, key=lambda x: -x[2])[
+            : options["top"]
+        ]:
+            self.stdout.write(f"  {cumulative_us / 1000:8.1f}ms  {name}")
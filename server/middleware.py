@@ -0,0 +1,129 @@
+import logging
+
+import redis
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.regex_helper import _lazy_re_compile
+from rest_framework.permissions import SAFE_METHODS
+
+from .compression import compress, negotiate
+from .routers import replica_reads
+from .utils import redis_client
+
+logger = logging.getLogger(__name__)
+
+re_start_etag = _lazy_re_compile(r"^\"")
+
+
+def pin_key(user_id):
+    return f"db_pin:{user_id}"
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    # Аналог GZipMiddleware с поддержкой Brotli и заранее сжатых вариантов
+    # ответа в атрибуте response.precompressed ({"br": ..., "gzip": ...}).
+    def process_response(self, request, response):
+        if response.streaming or response.has_header("Content-Encoding"):
+            return response
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        encoding = negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        precompressed = getattr(response, "precompressed", None) or {}
+        content = precompressed.get(encoding)
+        if content is None:
+            content = compress(response.content, encoding)
+        if len(content) >= len(response.content):
+            return response
+
+        response.content = content
+        response["Content-Length"] = str(len(content))
+        response["Content-Encoding"] = encoding
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = re_start_etag.sub('W/"', etag)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    # Безопасные запросы читают с реплик. Пользователь, только что
+    # выполнивший запись, на READ_YOUR_WRITES_SECONDS закрепляется за
+    # основной базой через метку db_pin:<user_id> в Redis. Работает и в
+    # асинхронной цепочке: под ASGI async-view (SSE, AsyncLoginView) не
+    # переводятся в поток ради этого middleware.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        safe = request.method in SAFE_METHODS
+        pinned = safe and _pinned(request.session.get(SESSION_KEY))
+        token = replica_reads.set(safe and not pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            replica_reads.reset(token)
+
+        user = getattr(request, "user", None)
+        if not safe and response.status_code < 400 and user and user.is_authenticated:
+            _pin(user.pk)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        # Клиент Redis синхронный: его вызовы уходят в пул потоков, а не
+        # в поток sync-view.
+        safe = request.method in SAFE_METHODS
+        pinned = safe and await sync_to_async(_pinned, thread_sensitive=False)(
+            await request.session.aget(SESSION_KEY)
+        )
+        token = replica_reads.set(safe and not pinned)
+        try:
+            response = await self.get_response(request)
+        finally:
+            replica_reads.reset(token)
+
+        auser = getattr(request, "auser", None)
+        if not safe and response.status_code < 400 and auser:
+            user = await auser()
+            if user.is_authenticated:
+                await sync_to_async(_pin, thread_sensitive=False)(user.pk)
+        return response
+
+
+def _pinned(user_id):
+    if user_id is None:
+        return False
+    try:
+        return bool(redis_client.exists(pin_key(user_id)))
+    except redis.RedisError:
+        # Без Redis нельзя проверить метку - безопаснее читать с основной.
+        return True
+
+
+def _pin(user_id):
+    try:
+        redis_client.set(pin_key(user_id), 1, ex=settings.READ_YOUR_WRITES_SECONDS)
+    except redis.RedisError:
+        logger.warning("Failed to pin user %s to primary", user_id, exc_info=True)
@@ -0,0 +1,105 @@
+# Generated by Django 5.2.1 on 2026-10-19 07:47
+
+import django.db.models.deletion
+import django_minio_backend.models
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_deactivated_at(apps, schema_editor):
+    Server = apps.get_model("server", "Server")
+    Server.objects.filter(is_active=False, deactivated_at__isnull=True).update(
+        deactivated_at=timezone.now()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0003_alter_server_image"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedServer",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("name", models.CharField(max_length=100)),
+                (
+                    "image",
+                    models.FileField(
+                        storage=django_minio_backend.models.MinioBackend(
+                            bucket_name="mybucket"
+                        ),
+                        upload_to="",
+                        verbose_name="Object Upload",
+                    ),
+                ),
+                ("mini_description", models.TextField()),
+                ("price", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("specifications", models.JSONField(default=list)),
+                ("deactivated_at", models.DateTimeField(blank=True, null=True)),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Архивная услуга",
+                "verbose_name_plural": "Архивные услуги",
+                "ordering": ["id"],
+            },
+        ),
+        migrations.AddField(
+            model_name="server",
+            name="deactivated_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_deactivated_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="applicationserver",
+            name="server",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="applications",
+                to="server.server",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="server",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["id"],
+                name="server_active_id_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="server",
+            index=models.Index(
+                condition=models.Q(("is_active", False)),
+                fields=["deactivated_at"],
+                name="server_inactive_since_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="applicationserver",
+            name="archived_server",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="applications",
+                to="server.archivedserver",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="applicationserver",
+            constraint=models.CheckConstraint(
+                condition=models.Q(
+                    ("server__isnull", False),
+                    ("archived_server__isnull", False),
+                    _connector="OR",
+                ),
+                name="application_server_has_server",
+            ),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.1 on 2026-10-19 07:48
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_prices(apps, schema_editor):
+    ApplicationServer = apps.get_model("server", "ApplicationServer")
+    Application = apps.get_model("server", "Application")
+    ArchivedApplication = apps.get_model("server", "ArchivedApplication")
+    Server = apps.get_model("server", "Server")
+    ArchivedServer = apps.get_model("server", "ArchivedServer")
+
+    ApplicationServer.objects.filter(server__isnull=False).update(
+        price=Subquery(Server.objects.filter(pk=OuterRef("server_id")).values("price"))
+    )
+    ApplicationServer.objects.filter(server__isnull=True).update(
+        price=Subquery(
+            ArchivedServer.objects.filter(pk=OuterRef("archived_server_id")).values(
+                "price"
+            )
+        )
+    )
+
+    totals = (
+        ApplicationServer.objects.filter(application_id=OuterRef("pk"))
+        .values("application_id")
+        .annotate(total=Sum("price"))
+        .values("total")
+    )
+    Application.objects.update(
+        total_price=Coalesce(
+            Subquery(totals),
+            Value(0),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+    )
+
+    archived = []
+    for application in ArchivedApplication.objects.only("id", "servers").iterator():
+        application.total_price = sum(
+            (Decimal(server["price"]) for server in application.servers), Decimal(0)
+        )
+        archived.append(application)
+        if len(archived) == 1000:
+            ArchivedApplication.objects.bulk_update(archived, ["total_price"])
+            archived = []
+    ArchivedApplication.objects.bulk_update(archived, ["total_price"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0005_archived_application"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="application",
+            name="total_price",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name="applicationserver",
+            name="price",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="archivedapplication",
+            name="total_price",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-19 07:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0006_price_snapshot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="server",
+            name="external_id",
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name="serverspecification",
+            name="external_id",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name="serverspecification",
+            constraint=models.UniqueConstraint(
+                fields=("server", "external_id"), name="server_spec_external_id_unique"
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-19 07:56
+
+import server.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0007_catalog_external_id"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="archivedserver",
+            name="image",
+            field=models.FileField(
+                storage=server.storage.LazyMinioStorage(bucket_name="mybucket"),
+                upload_to="",
+                verbose_name="Object Upload",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="server",
+            name="image",
+            field=models.FileField(
+                storage=server.storage.LazyMinioStorage(bucket_name="mybucket"),
+                upload_to="",
+                verbose_name="Object Upload",
+            ),
+        ),
+    ]
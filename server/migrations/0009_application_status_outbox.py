@@ -0,0 +1,74 @@
+# Generated by Django 5.2.1 on 2026-10-19 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0008_lazy_image_storage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ApplicationStatusEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("application_id", models.BigIntegerField()),
+                ("user_creator_id", models.IntegerField()),
+                ("changed_by_id", models.IntegerField(blank=True, null=True)),
+                (
+                    "previous_status",
+                    models.CharField(
+                        choices=[
+                            ("DRAFT", "Draft"),
+                            ("DELETED", "Deleted"),
+                            ("FORMED", "Formed"),
+                            ("COMPLETED", "Completed"),
+                            ("REJECTED", "Rejected"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("DRAFT", "Draft"),
+                            ("DELETED", "Deleted"),
+                            ("FORMED", "Formed"),
+                            ("COMPLETED", "Completed"),
+                            ("REJECTED", "Rejected"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("published_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "Событие заявки",
+                "verbose_name_plural": "События заявок",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["application_id", "id"],
+                        name="app_event_application_idx",
+                    ),
+                    models.Index(
+                        condition=models.Q(("published_at__isnull", True)),
+                        fields=["id"],
+                        name="app_event_unpublished_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
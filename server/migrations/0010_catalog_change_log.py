@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-19 08:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0009_application_status_outbox"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CatalogChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("server_id", models.BigIntegerField()),
+                ("changed_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Изменение каталога",
+                "verbose_name_plural": "Изменения каталога",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(fields=["changed_at"], name="catalog_change_at_idx")
+                ],
+            },
+        ),
+    ]
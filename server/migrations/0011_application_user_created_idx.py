@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-19 08:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0010_catalog_change_log"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="application",
+            index=models.Index(
+                fields=["user_creator", "created_at", "id"],
+                name="application_user_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivedapplication",
+            index=models.Index(
+                fields=["user_creator", "created_at", "id"],
+                name="archived_app_user_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-19 08:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0011_application_user_created_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="application",
+            name="claimed_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="application",
+            index=models.Index(
+                condition=models.Q(("status", "FORMED")),
+                fields=["created_at", "id"],
+                name="application_formed_queue_idx",
+            ),
+        ),
+    ]
@@ -1,7 +1,9 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
-from django_minio_backend import MinioBackend
+from django.utils import timezone
 from django.conf import settings
+from .storage import LazyMinioStorage
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -9,22 +11,73 @@ from django.contrib.auth.models import (
 )
 
 
+server_image_storage = LazyMinioStorage(bucket_name="mybucket")
+
+
+class ActiveServerManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(is_active=True)
+
+
 class Server(models.Model):
     name = models.CharField(max_length=100)
-    image = models.FileField(
-        verbose_name="Object Upload", storage=MinioBackend(bucket_name="mybucket")
-    )
+    image = models.FileField(verbose_name="Object Upload", storage=server_image_storage)
     mini_description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     is_active = models.BooleanField(default=True)
+    deactivated_at = models.DateTimeField(null=True, blank=True)
+    # Идентификатор услуги в фиде поставщика, ключ для импорта каталога.
+    external_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
+
+    objects = models.Manager()
+    active = ActiveServerManager()
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if self.is_active:
+            self.deactivated_at = None
+        elif self.deactivated_at is None:
+            self.deactivated_at = timezone.now()
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ["id"]
         verbose_name = "Услуга"
         verbose_name_plural = "Услуги"
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=Q(is_active=True),
+                name="server_active_id_idx",
+            ),
+            models.Index(
+                fields=["deactivated_at"],
+                condition=Q(is_active=False),
+                name="server_inactive_since_idx",
+            ),
+        ]
+
+
+class ArchivedServer(models.Model):
+    # Снимок услуги, вынесенной из горячей таблицы; id совпадает с исходным.
+    id = models.BigIntegerField(primary_key=True)
+    name = models.CharField(max_length=100)
+    image = models.FileField(verbose_name="Object Upload", storage=server_image_storage)
+    mini_description = models.TextField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    specifications = models.JSONField(default=list)
+    deactivated_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        ordering = ["id"]
+        verbose_name = "Архивная услуга"
+        verbose_name_plural = "Архивные услуги"
 
 
 class ServerSpecification(models.Model):
@@ -36,6 +89,7 @@ class ServerSpecification(models.Model):
     ram = models.CharField(max_length=100)
     disk = models.CharField(max_length=100)
     internet_speed = models.CharField(max_length=100)
+    external_id = models.CharField(max_length=100, null=True, blank=True)
 
     def __str__(self):
         return self.server.name
@@ -44,6 +98,28 @@ class ServerSpecification(models.Model):
         ordering = ["id"]
         verbose_name = "Характеристика услуги"
         verbose_name_plural = "Характеристики услуг"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["server", "external_id"],
+                name="server_spec_external_id_unique",
+            ),
+        ]
+
+
+class CatalogChange(models.Model):
+    # Журнал изменений каталога: id - сквозной номер изменения для
+    # дельта-синхронизации (servers/changes/?since=). Внешнего ключа нет,
+    # чтобы запись переживала архивацию услуги и служила признаком удаления.
+    server_id = models.BigIntegerField()
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+        verbose_name = "Изменение каталога"
+        verbose_name_plural = "Изменения каталога"
+        indexes = [
+            models.Index(fields=["changed_at"], name="catalog_change_at_idx"),
+        ]
 
 
 class ApplicationStatus(models.TextChoices):
@@ -63,6 +139,7 @@ class Application(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     user_creator = models.ForeignKey(
         User,
         on_delete=models.DO_NOTHING,
@@ -75,6 +152,8 @@ class Application(models.Model):
         blank=True,
         related_name="moderated_applications",
     )
+    # До этого момента заявка взята в работу модератором user_moderator.
+    claimed_until = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"Заявка № {self.id}"
@@ -83,6 +162,90 @@ class Application(models.Model):
         verbose_name = "Заявка"
         verbose_name_plural = "Заявки"
         ordering = ["created_at"]
+        indexes = [
+            # Очередь модерации: сформированные заявки в порядке поступления.
+            models.Index(
+                fields=["created_at", "id"],
+                condition=Q(status="FORMED"),
+                name="application_formed_queue_idx",
+            ),
+            # Keyset-пагинация истории заявок пользователя (app/my/).
+            models.Index(
+                fields=["user_creator", "created_at", "id"],
+                name="application_user_created_idx",
+            ),
+        ]
+
+
+class ArchivedApplication(models.Model):
+    # Завершённая заявка, вынесенная из рабочей таблицы вместе со снимком услуг.
+    id = models.BigIntegerField(primary_key=True)
+    status = models.CharField(max_length=20, choices=ApplicationStatus.choices)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    user_creator = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        related_name="archived_applications",
+    )
+    user_moderator = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        null=True,
+        blank=True,
+        related_name="archived_moderated_applications",
+    )
+    servers = models.JSONField(default=list)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Архивная заявка № {self.id}"
+
+    class Meta:
+        verbose_name = "Архивная заявка"
+        verbose_name_plural = "Архивные заявки"
+        ordering = ["created_at"]
+        indexes = [
+            models.Index(
+                fields=["user_creator", "created_at", "id"],
+                name="archived_app_user_created_idx",
+            ),
+        ]
+
+
+class ApplicationStatusEvent(models.Model):
+    # Outbox смен статуса: строка пишется в одной транзакции с заявкой,
+    # relay_outbox переносит её в Redis Stream. Внешних ключей нет, чтобы
+    # журнал переживал архивацию и удаление заявок.
+    application_id = models.BigIntegerField()
+    user_creator_id = models.IntegerField()
+    changed_by_id = models.IntegerField(null=True, blank=True)
+    previous_status = models.CharField(max_length=20, choices=ApplicationStatus.choices)
+    status = models.CharField(max_length=20, choices=ApplicationStatus.choices)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return (
+            f"Заявка № {self.application_id}: {self.previous_status} -> {self.status}"
+        )
+
+    class Meta:
+        verbose_name = "Событие заявки"
+        verbose_name_plural = "События заявок"
+        ordering = ["id"]
+        indexes = [
+            models.Index(
+                fields=["application_id", "id"],
+                name="app_event_application_idx",
+            ),
+            models.Index(
+                fields=["id"],
+                condition=Q(published_at__isnull=True),
+                name="app_event_unpublished_idx",
+            ),
+        ]
 
 
 class ApplicationServer(models.Model):
@@ -90,13 +253,37 @@ class ApplicationServer(models.Model):
         Application, on_delete=models.CASCADE, related_name="servers"
     )
     server = models.ForeignKey(
-        Server, on_delete=models.CASCADE, related_name="applications"
+        Server,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="applications",
+    )
+    archived_server = models.ForeignKey(
+        ArchivedServer,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="applications",
     )
+    # Цена услуги на момент добавления в заявку; дальнейшие правки
+    # Server.price не меняют уже собранные заявки.
+    price = models.DecimalField(max_digits=10, decimal_places=2)
 
     class Meta:
         unique_together = ("application", "server")
         verbose_name = "Услуга в заявке"
         verbose_name_plural = "Услуги в заявках"
+        constraints = [
+            models.CheckConstraint(
+                condition=Q(server__isnull=False) | Q(archived_server__isnull=False),
+                name="application_server_has_server",
+            ),
+        ]
+
+    @property
+    def service(self):
+        return self.server or self.archived_server
 
     def __str__(self):
-        return f"Заявка {self.application.id} - Услуга {self.server.name}"
+        return f"Заявка {self.application_id} - Услуга {self.service.name}"
@@ -0,0 +1,54 @@
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Application, ApplicationStatus
+
+
+def lease_holder(application):
+    # Заявку держит user_moderator, пока не истёк claimed_until.
+    if application.claimed_until is None or application.claimed_until <= timezone.now():
+        return None
+    return application.user_moderator_id
+
+
+def claim_applications(moderator, limit):
+    # Чужие действующие аренды отсекаются в самом запросе, а строки, которые
+    # прямо сейчас разбирает другой модератор, пропускаются через SKIP LOCKED:
+    # выдача не упирается в старые занятые заявки в начале очереди.
+    now = timezone.now()
+    claimed_until = now + datetime.timedelta(seconds=settings.MODERATION_LEASE_SECONDS)
+
+    with transaction.atomic():
+        claimed = list(
+            Application.objects.select_for_update(skip_locked=True)
+            .filter(status=ApplicationStatus.FORMED)
+            .filter(
+                Q(claimed_until__isnull=True)
+                | Q(claimed_until__lte=now)
+                | Q(user_moderator=moderator)
+            )
+            .order_by("created_at", "id")[:limit]
+        )
+        if claimed:
+            # Своя аренда при повторном claim просто продлевается.
+            Application.objects.filter(pk__in=[app.pk for app in claimed]).update(
+                user_moderator=moderator, claimed_until=claimed_until
+            )
+            for application in claimed:
+                application.user_moderator = moderator
+                application.claimed_until = claimed_until
+
+    return claimed
+
+
+def release_application(application_id, moderator):
+    released = Application.objects.filter(
+        pk=application_id,
+        user_moderator=moderator,
+        claimed_until__gt=timezone.now(),
+    ).update(claimed_until=None)
+    return released > 0
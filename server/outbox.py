@@ -0,0 +1,94 @@
+import logging
+
+from django.conf import settings
+from django.utils import timezone
+from redis.exceptions import LockError
+
+from .models import ApplicationStatusEvent
+from .utils import redis_client
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "app_events:stream"
+RELAY_LOCK_KEY = "outbox:relay"
+
+
+def record_status_change(application, previous_status, changed_by=None):
+    # Вызывается внутри transaction.atomic() после application.save(): UPDATE
+    # заявки держит блокировку строки до коммита, поэтому id событий одной
+    # заявки растут в порядке фиксации транзакций.
+    return ApplicationStatusEvent.objects.create(
+        application_id=application.pk,
+        user_creator_id=application.user_creator_id,
+        changed_by_id=changed_by.pk if changed_by is not None else None,
+        previous_status=previous_status,
+        status=application.status,
+    )
+
+
+def to_stream_entry(event):
+    return {
+        "event_id": event.pk,
+        "application": event.application_id,
+        "user_creator": event.user_creator_id,
+        "changed_by": "" if event.changed_by_id is None else event.changed_by_id,
+        "previous_status": event.previous_status,
+        "status": event.status,
+        "created_at": event.created_at.isoformat(),
+    }
+
+
+def relay_batch(batch_size):
+    # At-least-once: событие помечается отправленным только после XADD, так что
+    # при падении между ними оно уйдёт повторно; потребители отбрасывают
+    # дубликаты по event_id.
+    events = list(
+        ApplicationStatusEvent.objects.filter(published_at__isnull=True).order_by("id")[
+            :batch_size
+        ]
+    )
+    if not events:
+        return 0
+
+    pipe = redis_client.pipeline(transaction=False)
+    for event in events:
+        pipe.xadd(
+            STREAM_KEY,
+            to_stream_entry(event),
+            maxlen=settings.OUTBOX_STREAM_MAXLEN,
+            approximate=True,
+        )
+    pipe.execute()
+
+    ApplicationStatusEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+        published_at=timezone.now()
+    )
+    return len(events)
+
+
+def relay_outbox(stop, once=False):
+    # Relay работает в одном экземпляре: параллельные relay могли бы
+    # переставить события одной заявки в потоке.
+    lock = redis_client.lock(RELAY_LOCK_KEY, timeout=settings.OUTBOX_RELAY_LOCK_SECONDS)
+    if not lock.acquire(blocking=False):
+        logger.info("Outbox relay is already running elsewhere")
+        return 0
+
+    relayed = 0
+    try:
+        while not stop.is_set():
+            count = relay_batch(settings.OUTBOX_RELAY_BATCH_SIZE)
+            relayed += count
+            # Продлевает блокировку; если её успели перехватить, relay
+            # останавливается, не отправляя следующую пачку.
+            lock.reacquire()
+            if count < settings.OUTBOX_RELAY_BATCH_SIZE:
+                if once:
+                    break
+                stop.wait(settings.OUTBOX_RELAY_POLL_SECONDS)
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            logger.warning("Outbox relay lock was lost", exc_info=True)
+    return relayed
@@ -0,0 +1,189 @@
+import logging
+
+import redis
+from django.conf import settings
+
+from .jobs import job
+from .models import (
+    Application,
+    ApplicationServer,
+    ApplicationStatus,
+    ArchivedApplication,
+    Server,
+)
+from .utils import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Заявки, которые считаются "арендой вместе": черновики и удалённые не в счёт.
+COUNTED_STATUSES = [ApplicationStatus.FORMED, ApplicationStatus.COMPLETED]
+WRITE_CHUNK_SIZE = 500
+
+
+def recommendation_key(server_id):
+    return f"recs:{server_id}"
+
+
+def applied_key(application_id):
+    return f"recs:applied:{application_id}"
+
+
+def _baskets(batch_size):
+    # Пачки пар (заявка, услуга): сначала рабочие заявки, потом архивные
+    # (у них состав хранится снимком в JSON). Заявка целиком попадает в одну
+    # пачку, иначе пары на границе пачек потерялись бы.
+    last_id = 0
+    while True:
+        ids = list(
+            Application.objects.filter(status__in=COUNTED_STATUSES, id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+        yield list(
+            ApplicationServer.objects.filter(
+                application_id__in=ids, server__isnull=False
+            ).values_list("application_id", "server_id")
+        )
+
+    last_id = 0
+    while True:
+        rows = list(
+            ArchivedApplication.objects.filter(
+                status__in=COUNTED_STATUSES, id__gt=last_id
+            )
+            .order_by("id")
+            .values_list("id", "servers")[:batch_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        yield [
+            (application_id, server["id"])
+            for application_id, servers in rows
+            for server in servers
+        ]
+
+
+def build_cooccurrence(batch_size):
+    # numpy/scipy нужны только офлайн-сборке, поэтому импортируются здесь,
+    # а не при старте веб-воркеров.
+    import numpy as np
+    from scipy import sparse
+
+    server_ids = np.fromiter(
+        Server.active.order_by("id").values_list("id", flat=True), dtype=np.int64
+    )
+    n_servers = len(server_ids)
+    counts = sparse.csr_matrix((n_servers, n_servers), dtype=np.int32)
+    if not n_servers:
+        return server_ids, counts
+
+    for pairs in _baskets(batch_size):
+        if not pairs:
+            continue
+        pairs = np.asarray(pairs, dtype=np.int64)
+        # Номер столбца услуги ищется бинарным поиском по отсортированным id;
+        # пары с неактивными и архивными услугами отбрасываются.
+        columns = np.searchsorted(server_ids, pairs[:, 1]).clip(max=n_servers - 1)
+        known = server_ids[columns] == pairs[:, 1]
+        _, rows = np.unique(pairs[known, 0], return_inverse=True)
+        columns = columns[known]
+        if not len(columns):
+            continue
+
+        # Матрица инцидентности заявки x услуги пачки; повторы одной услуги
+        # в заявке схлопываются в 1. A.T @ A - число заявок с обеими услугами.
+        incidence = sparse.csr_matrix(
+            (np.ones(len(columns), dtype=np.int32), (rows, columns)),
+            shape=(rows.max() + 1, n_servers),
+        )
+        incidence.data[:] = 1
+        counts = counts + (incidence.T @ incidence).tocsr()
+
+    counts.setdiag(0)
+    counts.eliminate_zeros()
+    return server_ids, counts
+
+
+def top_related(server_ids, counts, limit):
+    import numpy as np
+
+    for row in range(counts.shape[0]):
+        start, end = counts.indptr[row], counts.indptr[row + 1]
+        if start == end:
+            yield server_ids[row], {}
+            continue
+        data = counts.data[start:end]
+        columns = counts.indices[start:end]
+        if len(data) > limit:
+            best = np.argpartition(-data, limit)[:limit]
+            data, columns = data[best], columns[best]
+        yield server_ids[row], {
+            int(server_ids[column]): int(count) for column, count in zip(columns, data)
+        }
+
+
+def rebuild_recommendations(batch_size):
+    # Полная пересборка; в Redis хранится RECOMMENDATIONS_STORED соседей,
+    # чтобы инкрементальные обновления было куда накапливать.
+    server_ids, counts = build_cooccurrence(batch_size)
+    stats = {"servers": len(server_ids), "pairs": int(counts.nnz)}
+
+    pipe = redis_client.pipeline(transaction=True)
+    for index, (server_id, related) in enumerate(
+        top_related(server_ids, counts, settings.RECOMMENDATIONS_STORED), start=1
+    ):
+        key = recommendation_key(server_id)
+        pipe.delete(key)
+        if related:
+            pipe.zadd(key, related)
+            pipe.expire(key, settings.RECOMMENDATIONS_TTL_SECONDS)
+        if index % WRITE_CHUNK_SIZE == 0:
+            pipe.execute()
+    pipe.execute()
+    return stats
+
+
+@job
+def record_formed_application(application_id):
+    # Инкрементальное обновление при формировании заявки. Метка applied
+    # защищает от двойного счёта при повторе задачи; неточности (например,
+    # удалённые позже заявки) исправляет ночная пересборка.
+    server_ids = set(
+        ApplicationServer.objects.filter(
+            application_id=application_id, server__isnull=False
+        ).values_list("server_id", flat=True)
+    )
+    if len(server_ids) < 2:
+        return
+    if not redis_client.set(
+        applied_key(application_id),
+        1,
+        nx=True,
+        ex=settings.RECOMMENDATIONS_TTL_SECONDS,
+    ):
+        return
+
+    pipe = redis_client.pipeline(transaction=True)
+    for server_id in server_ids:
+        key = recommendation_key(server_id)
+        for other_id in server_ids - {server_id}:
+            pipe.zincrby(key, 1, other_id)
+        pipe.zremrangebyrank(key, 0, -settings.RECOMMENDATIONS_STORED - 1)
+        pipe.expire(key, settings.RECOMMENDATIONS_TTL_SECONDS)
+    pipe.execute()
+
+
+def get_recommendations(server_id, limit):
+    # [(id услуги, число совместных заявок)] по убыванию; один ZREVRANGE.
+    try:
+        rows = redis_client.zrevrange(
+            recommendation_key(server_id), 0, limit - 1, withscores=True
+        )
+    except redis.RedisError:
+        logger.warning("Recommendations are unavailable", exc_info=True)
+        return []
+    return [(int(member), int(score)) for member, score in rows]
@@ -0,0 +1,16 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_encoder = JSONEncoder()
+
+
+class ORJSONRenderer(JSONRenderer):
+    # Типы, которые orjson не знает (Decimal, ленивые строки и т.п.),
+    # сериализуются тем же кодировщиком, что и в стандартном JSONRenderer.
+    options = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return orjson.dumps(data, default=_encoder.default, option=self.options)
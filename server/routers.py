@@ -0,0 +1,36 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Выставляется ReplicaRoutingMiddleware только для безопасных запросов;
+# вне HTTP (команды, воркеры) чтение всегда идёт в основную базу.
+replica_reads = ContextVar("replica_reads", default=False)
+
+
+@contextmanager
+def primary_reads():
+    # Для заполнения кэшей, помеченных версией: реплика может отставать,
+    # и устаревшие данные закэшировались бы уже под новой версией.
+    token = replica_reads.set(False)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if replica_reads.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
@@ -1,13 +1,53 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import Application, Server, ServerSpecification
+from .catalog import bump_catalog_version, record_catalog_changes
+from .models import (
+    Application,
+    ArchivedApplication,
+    ArchivedServer,
+    Server,
+    ServerSpecification,
+)
 from django.contrib.auth.models import User
 from rest_framework.serializers import ValidationError
 
 
-class ServerSerializer(serializers.ModelSerializer):
+class DynamicFieldsMixin:
+    # fields=[...] оставляет в выдаче только перечисленные поля.
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            unknown = set(fields) - set(self.fields)
+            if not fields or unknown:
+                raise ValueError(f"Invalid fields: {sorted(unknown) or 'empty'}")
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class ServerSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Server
-        fields = "__all__"
+        fields = ["id", "name", "image", "mini_description", "price", "is_active"]
+
+
+class ArchivedServerSerializer(serializers.ModelSerializer):
+    is_active = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ArchivedServer
+        fields = [
+            "id",
+            "name",
+            "image",
+            "mini_description",
+            "price",
+            "is_active",
+            "deactivated_at",
+        ]
+
+    def get_is_active(self, obj):
+        return False
 
 
 class ServerSpecSerializer(serializers.ModelSerializer):
@@ -16,8 +56,19 @@ class ServerSpecSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class ServerSpecNestedSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
+
+    class Meta:
+        model = ServerSpecification
+        fields = ["id", "description", "processor", "ram", "disk", "internet_speed"]
+
+
+SPEC_UPDATE_FIELDS = ["description", "processor", "ram", "disk", "internet_speed"]
+
+
 class ServerDetailSerializer(serializers.ModelSerializer):
-    specifications = ServerSpecSerializer(many=True, read_only=True)
+    specifications = ServerSpecNestedSerializer(many=True, required=False)
 
     class Meta:
         model = Server
@@ -31,8 +82,90 @@ class ServerDetailSerializer(serializers.ModelSerializer):
             "specifications",
         ]
 
+    def validate_specifications(self, value):
+        ids = [item["id"] for item in value if "id" in item]
+        if len(ids) != len(set(ids)):
+            raise ValidationError("Duplicate specification ids")
+        if ids:
+            if self.instance is None:
+                raise ValidationError("Specification ids are not allowed on create")
+            own_ids = set(self.instance.specifications.values_list("pk", flat=True))
+            foreign = set(ids) - own_ids
+            if foreign:
+                raise ValidationError(
+                    f"Specifications do not belong to this server: {sorted(foreign)}"
+                )
+        return value
 
-class ApplicationSerializer(serializers.ModelSerializer):
+    def create(self, validated_data):
+        specifications = validated_data.pop("specifications", [])
+        with transaction.atomic():
+            server = super().create(validated_data)
+            self._apply_specifications(server, specifications)
+        return server
+
+    def update(self, instance, validated_data):
+        # Без ключа "specifications" характеристики не трогаются.
+        specifications = validated_data.pop("specifications", None)
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            if specifications is not None:
+                self._apply_specifications(instance, specifications)
+        return instance
+
+    def _apply_specifications(self, server, specifications):
+        # Список из запроса - полное состояние: новые строки создаются одним
+        # bulk_create, изменённые - одним bulk_update, пропавшие - одним DELETE.
+        existing = {spec.pk: spec for spec in server.specifications.all()}
+        to_create = []
+        to_update = []
+        for item in specifications:
+            spec_id = item.pop("id", None)
+            spec = existing.pop(spec_id, None) if spec_id is not None else None
+            if spec is None:
+                to_create.append(ServerSpecification(server=server, **item))
+                continue
+            for name, value in item.items():
+                setattr(spec, name, value)
+            to_update.append(spec)
+
+        if existing:
+            ServerSpecification.objects.filter(pk__in=existing).delete()
+        if to_update:
+            ServerSpecification.objects.bulk_update(to_update, SPEC_UPDATE_FIELDS)
+        if to_create:
+            ServerSpecification.objects.bulk_create(to_create)
+
+        # bulk-операции не отправляют сигналы, журнал и версию каталога
+        # обновляем сами.
+        record_catalog_changes([server.pk])
+        transaction.on_commit(bump_catalog_version)
+        if hasattr(server, "_prefetched_objects_cache"):
+            server._prefetched_objects_cache.pop("specifications", None)
+
+
+class ImportSpecSerializer(serializers.Serializer):
+    external_id = serializers.CharField(max_length=100)
+    description = serializers.CharField(allow_blank=True, default="")
+    processor = serializers.CharField(max_length=100)
+    ram = serializers.CharField(max_length=100)
+    disk = serializers.CharField(max_length=100)
+    internet_speed = serializers.CharField(max_length=100)
+
+
+class ImportServerSerializer(serializers.Serializer):
+    # Необязательные поля без default: отсутствующая в фиде колонка не
+    # перезаписывает значение у существующей услуги.
+    external_id = serializers.CharField(max_length=100)
+    name = serializers.CharField(max_length=100)
+    mini_description = serializers.CharField(allow_blank=True, required=False)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    image = serializers.CharField(max_length=100, allow_blank=True, required=False)
+    is_active = serializers.BooleanField(required=False)
+    specifications = ImportSpecSerializer(many=True, default=list)
+
+
+class ApplicationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     servers = serializers.SerializerMethodField()
 
     class Meta:
@@ -42,15 +175,46 @@ class ApplicationSerializer(serializers.ModelSerializer):
             "status",
             "created_at",
             "updated_at",
+            "total_price",
             "user_creator",
             "user_moderator",
             "servers",
         ]
 
     def get_servers(self, obj):
-        app_servers = obj.servers.all()
-        servers = [app_server.server for app_server in app_servers]
-        return ServerSerializer(servers, many=True).data
+        # Если клиент передал expand без "servers", вместо объектов отдаются id.
+        expand = self.context.get("expand")
+        if expand is not None and "servers" not in expand:
+            return [
+                app_server.server_id or app_server.archived_server_id
+                for app_server in obj.servers.all()
+            ]
+
+        servers = []
+        for app_server in obj.servers.all():
+            if app_server.server is not None:
+                data = ServerSerializer(app_server.server).data
+            else:
+                data = ArchivedServerSerializer(app_server.archived_server).data
+            data["application_price"] = str(app_server.price)
+            servers.append(data)
+        return servers
+
+
+class ArchivedApplicationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedApplication
+        fields = [
+            "pk",
+            "status",
+            "created_at",
+            "updated_at",
+            "total_price",
+            "user_creator",
+            "user_moderator",
+            "servers",
+            "archived_at",
+        ]
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -0,0 +1,74 @@
+from django.conf import settings
+
+from .catalog import CATALOG_VERSION_KEY
+from .compression import entry_body, pack, unpack
+from .models import Server, ServerSpecification
+from .renderers import ORJSONRenderer
+from .serializers import ServerDetailSerializer, ServerSpecSerializer
+from .tiered_cache import TieredCache
+
+_renderer = ORJSONRenderer()
+
+# Готовый JSON деталей услуги и характеристики: общий для servers/<id>/ и
+# servers/batch/, устаревает вместе с версией каталога. Вместе с JSON
+# хранятся сжатые варианты ответа servers/<id>/ (spec/<id>/).
+server_details = TieredCache(
+    "server_detail",
+    CATALOG_VERSION_KEY,
+    settings.SERVER_DETAIL_CACHE_SECONDS,
+    settings.SERVER_DETAIL_NEGATIVE_CACHE_SECONDS,
+)
+spec_details = TieredCache(
+    "spec_detail",
+    CATALOG_VERSION_KEY,
+    settings.SERVER_DETAIL_CACHE_SECONDS,
+    settings.SERVER_DETAIL_NEGATIVE_CACHE_SECONDS,
+)
+
+
+def success_body(data):
+    return f'{{"status":"success","data":{data}}}'
+
+
+def _entry(data):
+    return pack(data, success_body(data))
+
+
+def _load_servers(ids):
+    # Все промахи добираются одним IN-запросом и одним prefetch характеристик.
+    servers = Server.active.filter(pk__in=ids).prefetch_related("specifications")
+    return {
+        server.pk: _entry(
+            _renderer.render(ServerDetailSerializer(server).data).decode()
+        )
+        for server in servers
+    }
+
+
+def _load_specs(ids):
+    return {
+        spec.pk: _entry(_renderer.render(ServerSpecSerializer(spec).data).decode())
+        for spec in ServerSpecification.objects.filter(pk__in=ids)
+    }
+
+
+def _response(entry):
+    if entry is None:
+        return None
+    data, variants = unpack(entry)
+    return success_body(data), variants
+
+
+def get_server_details(ids):
+    # Возвращает {id: JSON ServerDetailSerializer или None}.
+    entries = server_details.get_many(ids, _load_servers)
+    return {pk: entry and entry_body(entry) for pk, entry in entries.items()}
+
+
+def get_server_detail_response(pk):
+    # (тело ответа servers/<id>/, сжатые варианты) или None.
+    return _response(server_details.get(pk, _load_servers))
+
+
+def get_spec_detail_response(pk):
+    return _response(spec_details.get(pk, _load_specs))
@@ -0,0 +1,66 @@
+from django.contrib.auth.models import Group, Permission, User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_permissions, invalidate_user_permissions
+from .catalog import bump_catalog_version, record_catalog_changes
+from .models import Server, ServerSpecification
+
+
+@receiver([post_save, post_delete], sender=Server)
+@receiver([post_save, post_delete], sender=ServerSpecification)
+def catalog_changed(sender, instance, **kwargs):
+    server_id = instance.pk if sender is Server else instance.server_id
+    record_catalog_changes([server_id])
+    transaction.on_commit(bump_catalog_version)
+
+
+def _invalidate_users(user_ids):
+    def invalidate():
+        for user_id in user_ids:
+            invalidate_user_permissions(user_id)
+
+    transaction.on_commit(invalidate)
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def user_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        _invalidate_users([instance.pk])
+    elif pk_set:
+        _invalidate_users(pk_set)
+    else:
+        # group.user_set.clear() и т.п.: затронутые пользователи неизвестны.
+        transaction.on_commit(invalidate_permissions)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def group_permissions_changed(sender, action, **kwargs):
+    if action.startswith("post_"):
+        transaction.on_commit(invalidate_permissions)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Вход (last_login) и обновление хэша пароля на права не влияют; у нового
+    # пользователя записи в кэше ещё нет.
+    if created:
+        return
+    if update_fields is not None and set(update_fields) <= {"last_login", "password"}:
+        return
+    _invalidate_users([instance.pk])
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    _invalidate_users([instance.pk])
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def permission_source_deleted(sender, **kwargs):
+    transaction.on_commit(invalidate_permissions)
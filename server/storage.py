@@ -0,0 +1,59 @@
+from django.core.files.storage import Storage
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+
+
+@deconstructible
+class LazyMinioStorage(Storage):
+    # Обёртка над MinioBackend: пакет minio импортируется, а бэкенд
+    # создаётся только при первом обращении к файлам, а не при импорте моделей.
+    def __init__(self, bucket_name):
+        self.bucket_name = bucket_name
+
+    @cached_property
+    def backend(self):
+        from django_minio_backend import MinioBackend
+
+        return MinioBackend(bucket_name=self.bucket_name)
+
+    def _open(self, name, mode="rb"):
+        return self.backend._open(name, mode)
+
+    def _save(self, name, content):
+        return self.backend._save(name, content)
+
+    def get_available_name(self, name, max_length=None):
+        return self.backend.get_available_name(name, max_length=max_length)
+
+    def delete(self, name):
+        return self.backend.delete(name)
+
+    def exists(self, name):
+        return self.backend.exists(name)
+
+    def listdir(self, path):
+        return self.backend.listdir(path)
+
+    def size(self, name):
+        return self.backend.size(name)
+
+    def url(self, name):
+        return self.backend.url(name)
+
+    def path(self, name):
+        return self.backend.path(name)
+
+    def get_accessed_time(self, name):
+        return self.backend.get_accessed_time(name)
+
+    def get_created_time(self, name):
+        return self.backend.get_created_time(name)
+
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
+
+    def __getattr__(self, name):
+        # stat(), client, check_bucket_existence() и прочие методы MinioBackend.
+        if name == "backend" or name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.backend, name)
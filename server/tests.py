@@ -1,3 +1,994 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import gzip
+import io
+import json
+import socket
+import subprocess
+import sys
+import threading
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import brotli
+import fakeredis
+import redis
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY, authenticate
+from django.contrib.auth.models import Group, Permission, User
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.core.management import call_command
+from django.db import connection, router
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    compression,
+    events,
+    facets,
+    idempotency,
+    jobs,
+    outbox,
+    tiered_cache,
+    views,
+)
+from .authentication import permission_cache
+from .catalog_import import CatalogImporter, read_csv, read_jsonl
+from .draft_cache import get_cached_draft, invalidate_draft, store_draft
+from .middleware import ReplicaRoutingMiddleware, pin_key
+from .models import (
+    Application,
+    ApplicationServer,
+    ApplicationStatus,
+    ApplicationStatusEvent,
+    Server,
+    ServerSpecification,
+)
+from .moderation import claim_applications, lease_holder, release_application
+from .routers import primary_reads
+from .server_cache import server_details
+from .utils import redis_client
+
+
+class FakeRedisMixin:
+    # Общий клиент и асинхронные клиенты событий смотрят в один FakeServer.
+    def setUp(self):
+        super().setUp()
+        self.redis_server = fakeredis.FakeServer()
+        fake = fakeredis.FakeStrictRedis(
+            server=self.redis_server, decode_responses=True
+        )
+        original_pool = redis_client.connection_pool
+        redis_client.connection_pool = fake.connection_pool
+        self.addCleanup(setattr, redis_client, "connection_pool", original_pool)
+        # Локальные LRU общие на процесс: записи прошлых тестов не видны.
+        tiered_cache._clear_local()
+
+    def async_redis_client(self):
+        return fakeredis.FakeAsyncRedis(server=self.redis_server, decode_responses=True)
+
+
+class ClaimApplicationsTests(TestCase):
+    def setUp(self):
+        self.creator = User.objects.create_user("creator")
+        self.moderators = [
+            User.objects.create_user(f"moderator{index}") for index in range(5)
+        ]
+        self.applications = [
+            Application.objects.create(
+                status=ApplicationStatus.FORMED, user_creator=self.creator
+            )
+            for _ in range(10)
+        ]
+
+    def test_each_moderator_gets_own_application(self):
+        claimed = [claim_applications(moderator, 1) for moderator in self.moderators]
+
+        self.assertTrue(all(len(batch) == 1 for batch in claimed))
+        self.assertEqual(len({batch[0].pk for batch in claimed}), 5)
+
+    def test_leased_applications_do_not_starve_later_claims(self):
+        for moderator in self.moderators[:4]:
+            claim_applications(moderator, 2)
+
+        claimed = claim_applications(self.moderators[4], 5)
+
+        self.assertEqual(
+            [application.pk for application in claimed],
+            [application.pk for application in self.applications[8:]],
+        )
+
+    def test_expired_lease_is_claimed_again(self):
+        first, second = self.moderators[:2]
+        application = claim_applications(first, 1)[0]
+        Application.objects.filter(pk=application.pk).update(
+            claimed_until=timezone.now() - datetime.timedelta(seconds=1)
+        )
+
+        self.assertEqual(claim_applications(second, 1)[0].pk, application.pk)
+        application.refresh_from_db()
+        self.assertEqual(lease_holder(application), second.pk)
+
+    def test_release_returns_application_to_queue(self):
+        first, second = self.moderators[:2]
+        application = claim_applications(first, 1)[0]
+
+        self.assertFalse(release_application(application.pk, second))
+        self.assertTrue(release_application(application.pk, first))
+        self.assertEqual(claim_applications(second, 1)[0].pk, application.pk)
+
+
+class StatusEventsTests(FakeRedisMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(
+            events, "get_async_redis_client", self.async_redis_client
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_published_status_reaches_subscriber(self):
+        creator = SimpleNamespace(pk=7, is_staff=False, is_superuser=False)
+        moderator = SimpleNamespace(pk=8, is_staff=True, is_superuser=False)
+        creator_stream = events.stream_status_events(creator)
+        moderator_stream = events.stream_status_events(moderator)
+        self.assertEqual(await anext(creator_stream), "retry: 3000\n\n")
+        self.assertEqual(await anext(moderator_stream), "retry: 3000\n\n")
+
+        payload = json.dumps({"application": 1, "status": "COMPLETED"})
+        events.send_status_change(creator.pk, payload)
+        events.send_status_change(9, json.dumps({"application": 2}))
+
+        expected = f"event: status\ndata: {payload}\n\n"
+        self.assertEqual(await asyncio.wait_for(anext(creator_stream), 1), expected)
+        self.assertEqual(await asyncio.wait_for(anext(moderator_stream), 1), expected)
+        await creator_stream.aclose()
+        await moderator_stream.aclose()
+
+    async def test_disconnect_closes_subscription(self):
+        user = SimpleNamespace(pk=7, is_staff=False, is_superuser=False)
+        stream = events.stream_status_events(user)
+        await anext(stream)
+        channel = events.user_channel(user.pk)
+        self.assertEqual(redis_client.pubsub_numsub(channel), [(channel, 1)])
+
+        # Так ASGI-обработчик Django закрывает ответ при отключении клиента.
+        await stream.aclose()
+
+        self.assertEqual(redis_client.pubsub_numsub(channel), [(channel, 0)])
+        self.assertEqual(
+            [
+                task
+                for task in asyncio.all_tasks()
+                if task is not asyncio.current_task()
+            ],
+            [],
+        )
+
+
+class ServerListTests(FakeRedisMixin, TestCase):
+    def test_list_hides_internal_fields(self):
+        Server.objects.create(
+            name="active", mini_description="", price=10, external_id="feed-1"
+        )
+        Server.objects.create(
+            name="inactive", mini_description="", price=5, is_active=False
+        )
+
+        response = self.client.get(reverse("servers-list"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            [
+                {
+                    "id": Server.objects.get(name="active").pk,
+                    "name": "active",
+                    "image": None,
+                    "mini_description": "",
+                    "price": "10.00",
+                    "is_active": True,
+                }
+            ],
+        )
+
+    def test_fields_must_be_known_and_not_empty(self):
+        Server.objects.create(name="active", mini_description="", price=10)
+        url = reverse("servers-list")
+
+        self.assertEqual(self.client.get(url, {"fields": ""}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"fields": " , "}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"fields": "id,nope"}).status_code, 400)
+        self.assertEqual(
+            self.client.get(url, {"fields": "id,name"}).json(),
+            [{"id": Server.objects.get().pk, "name": "active"}],
+        )
+
+
+class ApplicationListTests(TestCase):
+    def setUp(self):
+        moderator = User.objects.create_user("moderator", is_staff=True)
+        self.client.force_login(moderator)
+        self.application = Application.objects.create(
+            user_creator=moderator, status=ApplicationStatus.FORMED
+        )
+
+    def test_fields_must_be_known_and_not_empty(self):
+        url = reverse("application-list")
+
+        self.assertEqual(self.client.get(url, {"fields": ""}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"fields": "status,x"}).status_code, 400)
+        self.assertEqual(
+            self.client.get(url, {"fields": "pk,status"}).json()["data"],
+            [{"pk": self.application.pk, "status": "FORMED"}],
+        )
+
+
+class PrecompressedResponseTests(FakeRedisMixin, TestCase):
+    def test_cached_detail_is_compressed_once_at_fill(self):
+        server = Server.objects.create(
+            name="large", mini_description="x" * 4000, price=10
+        )
+        url = reverse("servers-detail", args=[server.pk])
+
+        with mock.patch.object(
+            compression, "compress", wraps=compression.compress
+        ) as compress:
+            first = self.client.get(url, HTTP_ACCEPT_ENCODING="br")
+            # Другой процесс: локальной копии нет, запись берётся из Redis
+            # уже со сжатыми вариантами.
+            tiered_cache._clear_local()
+            second = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(compress.call_count, len(compression.ENCODINGS))
+        self.assertEqual(first["Content-Encoding"], "br")
+        self.assertEqual(second["Content-Encoding"], "gzip")
+        self.assertEqual(
+            brotli.decompress(first.content), gzip.decompress(second.content)
+        )
+        body = json.loads(gzip.decompress(second.content))
+        self.assertEqual(body["data"]["mini_description"], "x" * 4000)
+
+    def test_batch_reads_json_of_packed_entries(self):
+        server = Server.objects.create(
+            name="large", mini_description="x" * 4000, price=10
+        )
+        self.client.get(reverse("servers-detail", args=[server.pk]))
+
+        response = self.client.get(reverse("servers-batch"), {"ids": server.pk})
+
+        self.assertEqual(response.json()["data"][0]["mini_description"], "x" * 4000)
+
+
+@override_settings(THROTTLE_RATES={"login_ip": "2/m"})
+class ThrottleTests(FakeRedisMixin, TestCase):
+    def login(self, **extra):
+        return self.client.post(
+            reverse("login"), {"username": "nobody", "password": "wrong"}, **extra
+        )
+
+    def test_bucket_rejects_with_retry_after_and_refills(self):
+        self.assertEqual(self.login().status_code, 401)
+        self.assertEqual(self.login().status_code, 401)
+
+        response = self.login()
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "30")
+
+        # Прошло полпериода - в ведре снова один токен.
+        key = "throttle:login_ip:127.0.0.1"
+        ts = int(redis_client.hget(key, "ts"))
+        redis_client.hset(key, "ts", ts - 30 * 1000)
+        self.assertEqual(self.login().status_code, 401)
+        self.assertEqual(self.login().status_code, 429)
+
+    def test_async_login_throttles_like_sync_login(self):
+        self.assertEqual(self.login().status_code, 401)
+        async_url = reverse("login-async")
+        credentials = {"username": "nobody", "password": "wrong"}
+        self.assertEqual(self.client.post(async_url, credentials).status_code, 401)
+
+        sync = self.login()
+        async_ = self.client.post(async_url, credentials)
+
+        self.assertEqual(async_.status_code, 429)
+        self.assertEqual(async_.json(), sync.json())
+        self.assertEqual(async_["Retry-After"], sync["Retry-After"])
+
+    def test_spoofed_forwarded_for_shares_client_bucket(self):
+        statuses = [
+            self.login(HTTP_X_FORWARDED_FOR=f"10.0.0.{index}").status_code
+            for index in range(4)
+        ]
+
+        self.assertEqual(statuses, [401, 401, 429, 429])
+        self.assertEqual(
+            redis_client.keys("throttle:login_ip:*"), ["throttle:login_ip:127.0.0.1"]
+        )
+
+
+class TotalPriceTests(FakeRedisMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("user")
+        self.client.force_login(self.user)
+        self.first = Server.objects.create(name="a", mini_description="", price=10)
+        self.second = Server.objects.create(
+            name="b", mini_description="", price="25.50"
+        )
+
+    def add(self, server):
+        return self.client.post(
+            reverse("draft-application-server-add"), {"server_id": server.pk}
+        )
+
+    def remove(self, server):
+        return self.client.delete(
+            reverse("remove-service-from-applic", args=[self.draft().pk, server.pk])
+        )
+
+    def draft(self):
+        return Application.objects.get(
+            user_creator=self.user, status=ApplicationStatus.DRAFT
+        )
+
+    def assertTotalMatchesServers(self):
+        draft = self.draft()
+        total = draft.servers.aggregate(total=Sum("price"))["total"] or 0
+        self.assertEqual(draft.total_price, total)
+        return draft.total_price
+
+    def test_total_follows_add_remove_and_repeated_add(self):
+        self.assertEqual(self.add(self.first).status_code, 200)
+        self.assertEqual(self.add(self.second).status_code, 200)
+        self.assertEqual(self.assertTotalMatchesServers(), Decimal("35.50"))
+
+        self.assertEqual(self.add(self.first).status_code, 400)
+        self.assertEqual(self.assertTotalMatchesServers(), Decimal("35.50"))
+
+        # Из заявки вычитается цена на момент добавления, а не текущая.
+        Server.objects.filter(pk=self.first.pk).update(price=99)
+        self.assertEqual(self.remove(self.first).status_code, 204)
+        self.assertEqual(self.assertTotalMatchesServers(), Decimal("25.50"))
+
+        self.first.refresh_from_db()
+        self.assertEqual(self.add(self.first).status_code, 200)
+        self.assertEqual(self.assertTotalMatchesServers(), Decimal("124.50"))
+
+
+class PriceBackfillMigrationTests(TransactionTestCase):
+    before = [("server", "0005_archived_application")]
+    after = [("server", "0006_price_snapshot")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        self.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def test_existing_application_gets_total_of_its_servers(self):
+        apps = self.migrate(self.before)
+        Server = apps.get_model("server", "Server")
+        Application = apps.get_model("server", "Application")
+        user = apps.get_model("auth", "User").objects.create(username="user")
+        application = Application.objects.create(user_creator_id=user.pk)
+        empty = Application.objects.create(user_creator_id=user.pk)
+        for price in ("10.00", "2.50"):
+            server = Server.objects.create(name=price, mini_description="", price=price)
+            apps.get_model("server", "ApplicationServer").objects.create(
+                application=application, server=server
+            )
+
+        apps = self.migrate(self.after)
+
+        Application = apps.get_model("server", "Application")
+        self.assertEqual(
+            Application.objects.get(pk=application.pk).total_price, Decimal("12.50")
+        )
+        self.assertEqual(Application.objects.get(pk=empty.pk).total_price, 0)
+        self.assertEqual(
+            sorted(
+                apps.get_model("server", "ApplicationServer").objects.values_list(
+                    "price", flat=True
+                )
+            ),
+            [Decimal("2.50"), Decimal("10.00")],
+        )
+
+
+class FacetsTests(FakeRedisMixin, TestCase):
+    def add_server(self, price, *specs):
+        server = Server.objects.create(name="s", mini_description="", price=price)
+        for processor, ram in specs:
+            ServerSpecification.objects.create(
+                server=server,
+                description="",
+                processor=processor,
+                ram=ram,
+                disk="1TB",
+                internet_speed="1G",
+            )
+        return server
+
+    def cached_facets(self):
+        return json.loads(facets.get_facets())["facets"]
+
+    def test_refresh_applies_only_logged_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cheap = self.add_server(100, ("i5", "8"), ("i5", "16"))
+            self.add_server(700, ("i7", "16"))
+            expensive = self.add_server(9000, ("i7", "64"))
+        self.assertEqual(self.cached_facets(), facets.compute_facets())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cheap.price = 3000
+            cheap.save()
+            expensive.is_active = False
+            expensive.save()
+            cheap.specifications.filter(ram="8").delete()
+            self.add_server(50, ("i9", "8"))
+
+        with mock.patch.object(facets, "_rebuild") as rebuild, mock.patch.object(
+            facets, "server_facets", wraps=facets.server_facets
+        ) as server_facets:
+            result = self.cached_facets()
+
+        rebuild.assert_not_called()
+        self.assertEqual(len(server_facets.call_args.args[0]), 3)
+        self.assertEqual(result, facets.compute_facets())
+        self.assertEqual(
+            result["price"],
+            [
+                {"value": "0-500", "count": 1},
+                {"value": "2500-5000", "count": 1},
+                {"value": "500-1000", "count": 1},
+            ],
+        )
+
+    def test_lost_state_triggers_full_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_server(100, ("i5", "8"))
+        self.cached_facets()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_server(700, ("i7", "16"))
+        redis_client.delete(facets.FACETS_MEMBERS_KEY)
+
+        with mock.patch.object(facets, "_rebuild", wraps=facets._rebuild) as rebuild:
+            result = self.cached_facets()
+
+        rebuild.assert_called_once()
+        self.assertEqual(result, facets.compute_facets())
+
+
+class CatalogImportTests(FakeRedisMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.server = Server.objects.create(
+            name="old",
+            image="old.png",
+            mini_description="kept",
+            price=100,
+            is_active=False,
+            external_id="ext-1",
+        )
+
+    def test_partial_feed_keeps_missing_columns(self):
+        feed = io.StringIO("external_id,name,price\next-1,renamed,150\next-2,new,70\n")
+
+        stats = CatalogImporter().run(read_csv(feed))
+
+        self.assertEqual(stats["errors"], 0)
+        self.server.refresh_from_db()
+        self.assertEqual(self.server.name, "renamed")
+        self.assertEqual(self.server.price, 150)
+        self.assertEqual(self.server.image.name, "old.png")
+        self.assertEqual(self.server.mini_description, "kept")
+        self.assertFalse(self.server.is_active)
+        self.assertIsNotNone(self.server.deactivated_at)
+        created = Server.objects.get(external_id="ext-2")
+        self.assertTrue(created.is_active)
+        self.assertEqual(created.mini_description, "")
+
+    def test_rows_with_different_columns_in_one_batch(self):
+        feed = io.StringIO(
+            json.dumps({"external_id": "ext-1", "name": "a", "price": 1})
+            + "\n"
+            + json.dumps(
+                {"external_id": "ext-2", "name": "b", "price": 2, "is_active": False}
+            )
+            + "\n"
+            + json.dumps(
+                {"external_id": "ext-1", "name": "a", "price": 1, "is_active": True}
+            )
+        )
+
+        CatalogImporter().run(read_jsonl(feed))
+
+        self.server.refresh_from_db()
+        self.assertTrue(self.server.is_active)
+        self.assertIsNone(self.server.deactivated_at)
+        self.assertEqual(self.server.mini_description, "kept")
+        self.assertFalse(Server.objects.get(external_id="ext-2").is_active)
+
+
+class DraftCacheTests(FakeRedisMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("creator")
+
+    def test_stale_fill_does_not_overwrite_newer_draft(self):
+        hit, _, draft_version = get_cached_draft(self.user.pk)
+        self.assertFalse(hit)
+
+        # Пока GET собирал ответ "черновика нет", пользователь его создал.
+        application = Application.objects.create(user_creator=self.user)
+        body = store_draft(self.user.pk, application)
+        store_draft(self.user.pk, None, draft_version)
+
+        self.assertEqual(get_cached_draft(self.user.pk)[:2], (True, body))
+
+    def test_fill_after_invalidation_is_dropped(self):
+        application = Application.objects.create(user_creator=self.user)
+        _, _, draft_version = get_cached_draft(self.user.pk)
+        invalidate_draft(self.user.pk)
+
+        store_draft(self.user.pk, application, draft_version)
+
+        self.assertFalse(get_cached_draft(self.user.pk)[0])
+
+    def test_fill_on_read_is_cached(self):
+        application = Application.objects.create(user_creator=self.user)
+        _, _, draft_version = get_cached_draft(self.user.pk)
+
+        body = store_draft(self.user.pk, application, draft_version)
+
+        self.assertEqual(get_cached_draft(self.user.pk)[:2], (True, body))
+
+
+class IdempotencyTests(FakeRedisMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("user")
+        self.client.force_login(self.user)
+        self.server = Server.objects.create(name="a", mini_description="", price=10)
+        self.url = reverse("draft-application-server-add")
+
+    def add(self, server, key="key-1"):
+        return self.client.post(
+            self.url,
+            {"server_id": server.pk},
+            content_type="application/json",
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def claim_in_flight(self, key="key-1"):
+        # Первый запрос с этим ключом ещё выполняется в другом процессе.
+        request = SimpleNamespace(
+            method="POST", path=self.url, data={"server_id": self.server.pk}
+        )
+        redis_key = f"idempotency:{self.user.pk}:POST:{self.url}:{key}"
+        pending = {"state": "pending", "fingerprint": idempotency.fingerprint(request)}
+        redis_client.set(redis_key, json.dumps(pending))
+        return redis_key, pending
+
+    def test_retry_replays_first_response(self):
+        first = self.add(self.server)
+        second = self.add(self.server)
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(ApplicationServer.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0.2)
+    def test_in_flight_key_returns_409_after_wait(self):
+        self.claim_in_flight()
+
+        response = self.add(self.server)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(ApplicationServer.objects.exists())
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=5)
+    def test_in_flight_key_waits_and_replays(self):
+        redis_key, pending = self.claim_in_flight()
+        done = dict(
+            pending,
+            state="done",
+            response={"status": 200, "data": '{"status":"success"}'},
+        )
+        timer = threading.Timer(0.2, redis_client.set, [redis_key, json.dumps(done)])
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        response = self.add(self.server)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"status": "success"})
+        self.assertEqual(response["Idempotent-Replayed"], "true")
+        self.assertFalse(ApplicationServer.objects.exists())
+
+    def test_key_reused_with_another_body_returns_422(self):
+        other = Server.objects.create(name="b", mini_description="", price=5)
+        self.add(self.server)
+
+        response = self.add(other)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(ApplicationServer.objects.count(), 1)
+
+    def test_key_is_released_on_5xx(self):
+        application = Application.objects.create(user_creator=self.user)
+        url = reverse("application-formed", args=[application.pk])
+
+        with mock.patch.object(
+            views, "record_status_change", side_effect=RuntimeError("db down")
+        ):
+            failed = self.client.put(url, HTTP_IDEMPOTENCY_KEY="key-1")
+        retried = self.client.put(url, HTTP_IDEMPOTENCY_KEY="key-1")
+
+        self.assertEqual(failed.status_code, 500)
+        self.assertEqual(retried.status_code, 200)
+        self.assertFalse(retried.has_header("Idempotent-Replayed"))
+        application.refresh_from_db()
+        self.assertEqual(application.status, ApplicationStatus.FORMED)
+
+
+class OutboxRelayTests(FakeRedisMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user("creator")
+        self.application = Application.objects.create(user_creator=user)
+        self.events = [
+            self.record_status_change(previous, status)
+            for previous, status in [
+                (ApplicationStatus.DRAFT, ApplicationStatus.FORMED),
+                (ApplicationStatus.FORMED, ApplicationStatus.REJECTED),
+                (ApplicationStatus.REJECTED, ApplicationStatus.FORMED),
+            ]
+        ]
+
+    def record_status_change(self, previous, status):
+        self.application.status = status
+        return outbox.record_status_change(self.application, previous)
+
+    def streamed_ids(self):
+        return [
+            int(fields["event_id"])
+            for _, fields in redis_client.xrange(outbox.STREAM_KEY)
+        ]
+
+    def unpublished_ids(self):
+        return list(
+            ApplicationStatusEvent.objects.filter(published_at__isnull=True)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+
+    def test_batches_are_streamed_in_id_order(self):
+        ids = [event.pk for event in self.events]
+
+        self.assertEqual(outbox.relay_batch(2), 2)
+        self.assertEqual(self.streamed_ids(), ids[:2])
+        self.assertEqual(self.unpublished_ids(), ids[2:])
+
+        self.assertEqual(outbox.relay_batch(2), 1)
+        self.assertEqual(outbox.relay_batch(2), 0)
+        self.assertEqual(self.streamed_ids(), ids)
+        self.assertEqual(self.unpublished_ids(), [])
+
+    def test_failed_xadd_keeps_events_for_next_relay(self):
+        with mock.patch.object(
+            redis.client.Pipeline,
+            "execute",
+            side_effect=redis.ConnectionError("Redis went away"),
+        ):
+            with self.assertRaises(redis.ConnectionError):
+                outbox.relay_batch(10)
+
+        self.assertEqual(self.streamed_ids(), [])
+        self.assertEqual(len(self.unpublished_ids()), 3)
+
+        self.assertEqual(outbox.relay_batch(10), 3)
+        self.assertEqual(self.streamed_ids(), [event.pk for event in self.events])
+        self.assertEqual(self.unpublished_ids(), [])
+
+    @override_settings(OUTBOX_RELAY_BATCH_SIZE=2)
+    def test_command_relays_everything_once(self):
+        stdout = io.StringIO()
+        with mock.patch("signal.signal"):
+            call_command("relay_outbox", "--once", stdout=stdout)
+
+        self.assertEqual(stdout.getvalue().strip(), "relayed=3")
+        self.assertEqual(self.streamed_ids(), [event.pk for event in self.events])
+        self.assertEqual(redis_client.exists(outbox.RELAY_LOCK_KEY), 0)
+
+    def test_relay_skips_when_another_holds_the_lock(self):
+        redis_client.set(outbox.RELAY_LOCK_KEY, "other")
+
+        with self.assertLogs("server.outbox", "INFO"):
+            self.assertEqual(outbox.relay_outbox(threading.Event(), once=True), 0)
+
+        self.assertEqual(len(self.unpublished_ids()), 3)
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class ReplicaRoutingTests(FakeRedisMixin, SimpleTestCase):
+    def route(self, request):
+        # Куда роутер отправил бы чтение внутри обработки запроса.
+        seen = []
+
+        def get_response(request):
+            seen.append(router.db_for_read(Server))
+            with primary_reads():
+                seen.append(router.db_for_read(Server))
+            server_details.get_many(
+                [0], lambda ids: seen.append(router.db_for_read(Server)) or {}
+            )
+            return HttpResponse()
+
+        ReplicaRoutingMiddleware(get_response)(request)
+        return seen
+
+    async def aroute(self, request):
+        seen = []
+
+        async def get_response(request):
+            seen.append(router.db_for_read(Server))
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        await middleware(request)
+        return seen
+
+    def request(self, method, user_id=None):
+        request = getattr(RequestFactory(), method)("/api/servers/0/")
+        request.session = SessionStore()
+        if user_id is not None:
+            request.session[SESSION_KEY] = user_id
+
+        async def auser():
+            return SimpleNamespace(pk=user_id, is_authenticated=user_id is not None)
+
+        request.auser = auser
+        return request
+
+    def test_get_reads_replica_but_fills_caches_from_primary(self):
+        self.assertEqual(
+            self.route(self.request("get")), ["replica1", "default", "default"]
+        )
+
+    def test_pinned_user_and_writes_read_primary(self):
+        redis_client.set(pin_key(5), 1)
+
+        self.assertEqual(self.route(self.request("get", 5))[0], "default")
+        self.assertEqual(self.route(self.request("post"))[0], "default")
+        self.assertEqual(router.db_for_read(Server), "default")
+
+    async def test_async_chain_routes_and_pins(self):
+        self.assertEqual(await self.aroute(self.request("get", 5)), ["replica1"])
+
+        self.assertEqual(await self.aroute(self.request("post", 5)), ["default"])
+
+        self.assertEqual(redis_client.exists(pin_key(5)), 1)
+        self.assertEqual(await self.aroute(self.request("get", 5)), ["default"])
+        self.assertEqual(router.db_for_read(Server), "default")
+
+
+BOOT_SCRIPT = """
+import json
+import socket
+import sys
+
+attempts = []
+
+
+def connect(self, address):
+    attempts.append(repr(address))
+    raise OSError("network is disabled in this test")
+
+
+socket.socket.connect = connect
+
+from django.conf import settings
+
+settings.MINIO_ENDPOINT = sys.argv[1]
+
+import django
+
+django.setup()
+
+from django.urls import resolve
+
+resolve("/api/servers/")
+print(json.dumps(attempts))
+"""
+
+
+class StartupTests(SimpleTestCase):
+    def test_boot_does_not_reach_minio(self):
+        # Свободный порт: MinIO там точно нет, и любое обращение при старте
+        # или импорте URLconf было бы попыткой соединения.
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+
+        result = subprocess.run(
+            [sys.executable, "-c", BOOT_SCRIPT, f"127.0.0.1:{port}"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(json.loads(result.stdout), [])
+
+
+@jobs.job(max_attempts=3)
+def failing_job(counter_key):
+    redis_client.incr(counter_key)
+    raise RuntimeError("boom")
+
+
+def job_payload(func, *args):
+    return json.dumps({"id": "1", "name": func.job_name, "args": args, "attempts": 0})
+
+
+class JobWorkerTests(FakeRedisMixin, SimpleTestCase):
+    def test_redis_error_on_retry_keeps_worker_and_job(self):
+        redis_client.lpush(jobs.QUEUE_KEY, job_payload(failing_job, "runs"))
+        zadd = redis_client.zadd
+        failures = [redis.ConnectionError("Redis went away")]
+
+        def flaky_zadd(*args, **kwargs):
+            if failures:
+                raise failures.pop()
+            return zadd(*args, **kwargs)
+
+        with mock.patch.object(redis_client, "zadd", flaky_zadd), self.assertLogs(
+            "server.jobs", "WARNING"
+        ) as logs:
+            jobs.work(threading.Event(), burst=True, poll_seconds=0.1)
+
+        self.assertIn("Failed to hand off job", logs.output[1])
+
+        # Первый перенос в повтор не удался - задача вернулась в очередь и
+        # выполнилась ещё раз, второй раз ушла в отложенные.
+        self.assertEqual(redis_client.get("runs"), "2")
+        self.assertEqual(redis_client.zcard(jobs.DELAYED_KEY), 1)
+        self.assertEqual(redis_client.llen(jobs.QUEUE_KEY), 0)
+        self.assertEqual(redis_client.keys(jobs.PROCESSING_PREFIX + "*"), [])
+        self.assertEqual(redis_client.smembers(jobs.WORKERS_KEY), set())
+
+    def test_jobs_of_dead_worker_are_requeued(self):
+        dead, alive = job_payload(failing_job, "a"), job_payload(failing_job, "b")
+        redis_client.sadd(jobs.WORKERS_KEY, "dead", "alive")
+        redis_client.lpush(jobs.PROCESSING_PREFIX + "dead", dead)
+        redis_client.lpush(jobs.PROCESSING_PREFIX + "alive", alive)
+        redis_client.set(jobs.HEARTBEAT_PREFIX + "alive", 1)
+
+        self.assertEqual(jobs.requeue_stalled(), 1)
+
+        self.assertEqual(redis_client.lrange(jobs.QUEUE_KEY, 0, -1), [dead])
+        self.assertEqual(
+            redis_client.lrange(jobs.PROCESSING_PREFIX + "alive", 0, -1), [alive]
+        )
+        self.assertEqual(redis_client.smembers(jobs.WORKERS_KEY), {"alive"})
+
+
+class ServerBatchTests(FakeRedisMixin, TestCase):
+    def test_non_ascii_digits_are_rejected(self):
+        response = self.client.get(reverse("servers-batch"), {"ids": "1,²"})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_missing_ids_are_cached_briefly_and_not_locally(self):
+        server = Server.objects.create(name="s", mini_description="", price=1)
+
+        response = self.client.get(
+            reverse("servers-batch"), {"ids": f"{server.pk},999999"}
+        )
+
+        self.assertEqual(response.json()["missing"], [999999])
+        key = server_details.redis_key(999999)
+        self.assertLessEqual(
+            redis_client.ttl(key), settings.SERVER_DETAIL_NEGATIVE_CACHE_SECONDS
+        )
+        self.assertGreater(
+            redis_client.ttl(server_details.redis_key(server.pk)),
+            settings.SERVER_DETAIL_NEGATIVE_CACHE_SECONDS,
+        )
+        self.assertIsNone(server_details.local.get(key))
+        self.assertIsNotNone(
+            server_details.local.get(server_details.redis_key(server.pk))
+        )
+
+
+class PermissionCacheTests(FakeRedisMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("user", password="secret")
+        self.other = User.objects.create_user("other")
+        self.permission = Permission.objects.get(codename="view_server")
+
+    def cached(self, user):
+        return redis_client.get(permission_cache.redis_key(user.pk))
+
+    def has_perm(self, user):
+        return User.objects.get(pk=user.pk).has_perm("server.view_server")
+
+    def test_user_save_invalidates_only_that_user(self):
+        self.has_perm(self.user)
+        self.has_perm(self.other)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=["password"])
+            self.user.save(update_fields=["last_login"])
+        self.assertIsNotNone(self.cached(self.user))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.user_permissions.add(self.permission)
+
+        self.assertIsNone(self.cached(self.user))
+        self.assertIsNotNone(self.cached(self.other))
+        self.assertTrue(self.has_perm(self.user))
+
+    def test_group_change_invalidates_everyone(self):
+        group = Group.objects.create(name="moderators")
+        self.other.groups.add(group)
+        self.assertFalse(self.has_perm(self.other))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            group.permissions.add(self.permission)
+
+        self.assertTrue(self.has_perm(self.other))
+
+    def test_fill_started_before_invalidation_is_dropped(self):
+        def load(keys):
+            # Права прочитаны, и тут же пришла инвалидация.
+            permission_cache.invalidate_key(self.user.pk)
+            return {self.user.pk: "[]"}
+
+        permission_cache.get(self.user.pk, load)
+
+        self.assertIsNone(self.cached(self.user))
+        self.assertIsNone(
+            permission_cache.local.get(permission_cache.redis_key(self.user.pk))
+        )
+
+    def test_sessions_of_model_backend_stay_logged_in(self):
+        self.client.force_login(
+            self.user, backend="django.contrib.auth.backends.ModelBackend"
+        )
+
+        response = self.client.get(reverse("application-my-list"))
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_wrong_password_is_checked_once(self):
+        with mock.patch.object(
+            User, "check_password", autospec=True, return_value=False
+        ) as check_password:
+            self.assertIsNone(authenticate(username="user", password="wrong"))
+
+        self.assertEqual(check_password.call_count, 1)
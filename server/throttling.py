@@ -0,0 +1,108 @@
+import logging
+
+import redis
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from .utils import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Token bucket целиком на стороне Redis: чтение, пополнение и списание
+# выполняются атомарно, время берётся из TIME, чтобы не зависеть от часов
+# на разных узлах приложения.
+TOKEN_BUCKET_SCRIPT = redis_client.register_script(
+    """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate)
+
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = math.ceil((1 - tokens) / rate)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate))
+return {allowed, wait}
+"""
+)
+
+# Идентификатор приходит от клиента (имя пользователя, адрес из заголовка),
+# ключ в Redis не должен расти вместе с запросом. Имя длиннее поля модели
+# всё равно не войдёт.
+MAX_IDENT_LENGTH = 150
+
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    num, period = rate.split("/")
+    return int(num), PERIODS[period[0]]
+
+
+class RedisTokenBucketThrottle(BaseThrottle):
+    scope = None
+
+    def get_cache_key(self, request, view):
+        raise NotImplementedError(".get_cache_key() must be overridden")
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        rate = settings.THROTTLE_RATES.get(self.scope)
+        ident = self.get_cache_key(request, view)
+        if rate is None or ident is None:
+            return True
+
+        capacity, period = parse_rate(rate)
+        try:
+            allowed, wait_ms = TOKEN_BUCKET_SCRIPT(
+                keys=[f"throttle:{self.scope}:{ident[:MAX_IDENT_LENGTH]}"],
+                args=[capacity, capacity / (period * 1000)],
+            )
+        except redis.RedisError:
+            # Лимитер не должен выключать вход и поиск вместе с Redis.
+            logger.warning("Throttle %s is unavailable", self.scope, exc_info=True)
+            return True
+
+        self.wait_seconds = wait_ms / 1000
+        return bool(allowed)
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginIPThrottle(RedisTokenBucketThrottle):
+    scope = "login_ip"
+
+    def get_cache_key(self, request, view):
+        return self.get_ident(request)
+
+
+class LoginUsernameThrottle(RedisTokenBucketThrottle):
+    scope = "login_username"
+
+    def get_cache_key(self, request, view):
+        username = request.data.get("username")
+        if not isinstance(username, str) or not username:
+            return None
+        return username.lower()
+
+
+class SearchIPThrottle(RedisTokenBucketThrottle):
+    scope = "search_ip"
+
+    def get_cache_key(self, request, view):
+        if request.method != "GET" or not request.query_params.get("query"):
+            return None
+        return self.get_ident(request)
@@ -0,0 +1,277 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+from django.conf import settings
+
+from .routers import primary_reads
+from .utils import redis_client
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+# Сообщение "entry:<ключ в Redis>" сбрасывает одну запись, любое другое -
+# все кэши с таким version_key.
+ENTRY_MESSAGE_PREFIX = "entry:"
+NOT_FOUND = "-"
+
+# Заполнение кэша с поключевой инвалидацией: запись пропускается, если
+# поколение ключа сменилось после того, как писатель его прочитал.
+# KEYS - n записей и n ключей поколений, ARGV - тройки (поколение,
+# значение, ttl).
+FILL_SCRIPT = redis_client.register_script(
+    """
+local n = #KEYS / 2
+for i = 1, n do
+    local generation = redis.call('GET', KEYS[n + i]) or '0'
+    if generation == ARGV[3 * i - 2] then
+        redis.call('SET', KEYS[i], ARGV[3 * i - 1], 'EX', ARGV[3 * i])
+    end
+end
+return n
+"""
+)
+
+
+class LocalLRU:
+    # Ограниченный по размеру и времени жизни кэш процесса. Доступ из
+    # нескольких потоков (gthread-воркеры, поток подписки) - под блокировкой.
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.epoch = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, epoch):
+        # Запись из устаревшего чтения отбрасывается: если во время похода
+        # в Redis/базу пришла инвалидация, epoch уже сменился.
+        with self._lock:
+            if epoch != self.epoch:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.epoch += 1
+            self._data.clear()
+
+    def discard(self, key):
+        # Сдвиг epoch отбрасывает и заполнения, начатые до сброса ключа.
+        with self._lock:
+            self.epoch += 1
+            self._data.pop(key, None)
+
+
+_caches = []
+_listener = {"pid": None}
+_listener_lock = threading.Lock()
+
+
+def _clear_local(message=None):
+    if message is not None and message.startswith(ENTRY_MESSAGE_PREFIX):
+        redis_key = message[len(ENTRY_MESSAGE_PREFIX) :]
+        for cache in _caches:
+            if redis_key.startswith(f"{cache.name}:"):
+                cache.local.discard(redis_key)
+        return
+    for cache in _caches:
+        if message is None or cache.version_key == message:
+            cache.local.clear()
+
+
+def _listen():
+    while True:
+        try:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Пока подписки не было, сообщения могли потеряться.
+            _clear_local()
+            for message in pubsub.listen():
+                if message["type"] == "message":
+                    _clear_local(message["data"])
+        except redis.RedisError:
+            logger.warning("Cache invalidation listener disconnected", exc_info=True)
+            time.sleep(1)
+
+
+def _ensure_listener():
+    # Поток подписки запускается лениво и заново после fork: у каждого
+    # воркера gunicorn своя подписка и свой локальный кэш.
+    if _listener["pid"] == os.getpid():
+        return
+    with _listener_lock:
+        if _listener["pid"] == os.getpid():
+            return
+        _clear_local()
+        threading.Thread(target=_listen, name="cache-invalidation", daemon=True).start()
+        _listener["pid"] = os.getpid()
+
+
+def invalidate_version(version_key):
+    # Сдвигает версию (записи в Redis устаревают разом) и рассылает
+    # инвалидацию локальных кэшей всем процессам.
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.incr(version_key)
+        pipe.publish(INVALIDATION_CHANNEL, version_key)
+        version, _ = pipe.execute()
+    except redis.RedisError:
+        logger.warning("Failed to invalidate %s", version_key, exc_info=True)
+        return None
+    _clear_local(version_key)
+    return version
+
+
+class TieredCache:
+    # Двухуровневый кэш строковых значений: LRU процесса перед Redis.
+    # Записи в Redis хранятся как "версия:значение" и устаревают вместе
+    # с version_key; локальные копии сбрасываются сообщением в pub/sub.
+    # Отсутствующие ключи хранятся только в Redis и не дольше negative_ttl:
+    # перебор несуществующих id не вытесняет из LRU настоящие записи.
+    # С per_key=True отдельные ключи сбрасываются invalidate_key() без
+    # смены версии; для этого у каждого ключа есть счётчик поколений.
+    def __init__(self, name, version_key, redis_ttl, negative_ttl=None, per_key=False):
+        self.name = name
+        self.version_key = version_key
+        self.redis_ttl = redis_ttl
+        self.negative_ttl = redis_ttl if negative_ttl is None else negative_ttl
+        self.per_key = per_key
+        self.local = LocalLRU(
+            settings.LOCAL_CACHE_MAX_ENTRIES, settings.LOCAL_CACHE_TTL_SECONDS
+        )
+        _caches.append(self)
+
+    def redis_key(self, key):
+        return f"{self.name}:{key}"
+
+    def generation_key(self, key):
+        return f"{self.name}:{key}:generation"
+
+    def get_many(self, keys, load):
+        # load(missing_keys) -> {key: value}; ключи, которых нет в ответе,
+        # кэшируются как отсутствующие и возвращаются со значением None.
+        _ensure_listener()
+        epoch = self.local.epoch
+        values = {}
+        misses = []
+        for key in keys:
+            value = self.local.get(self.redis_key(key))
+            if value is None:
+                misses.append(key)
+            else:
+                values[key] = value
+        if not misses:
+            return values
+
+        # Поколения читаются тем же MGET до загрузки из базы.
+        generation_keys = (
+            [self.generation_key(key) for key in misses] if self.per_key else []
+        )
+        try:
+            version, *cached = redis_client.mget(
+                self.version_key,
+                *[self.redis_key(key) for key in misses],
+                *generation_keys,
+            )
+            version = version or "0"
+            generations = dict(zip(misses, cached[len(misses) :]))
+        except redis.RedisError:
+            logger.warning("Cache %s is unavailable", self.name, exc_info=True)
+            version, cached, generations = None, [None] * len(misses), {}
+
+        to_load = []
+        for key, value in zip(misses, cached):
+            if value is not None:
+                cached_version, _, body = value.partition(":")
+                if cached_version == version:
+                    if body == NOT_FOUND:
+                        values[key] = None
+                    else:
+                        self.local.set(self.redis_key(key), body, epoch)
+                        values[key] = body
+                    continue
+            to_load.append(key)
+        if not to_load:
+            return values
+
+        with primary_reads():
+            loaded = load(to_load)
+        for key in to_load:
+            values[key] = loaded.get(key)
+
+        if version is not None:
+            try:
+                self._fill(version, to_load, loaded, generations)
+            except redis.RedisError:
+                logger.warning("Failed to fill cache %s", self.name, exc_info=True)
+            # Без Redis версия неизвестна, и локальная копия могла бы пережить
+            # инвалидацию, поэтому в LRU кладём только после записи в Redis.
+            for key in to_load:
+                if key in loaded:
+                    self.local.set(self.redis_key(key), loaded[key], epoch)
+        return values
+
+    def _fill(self, version, keys, loaded, generations):
+        entries = []
+        for key in keys:
+            if key in loaded:
+                entries.append((key, f"{version}:{loaded[key]}", self.redis_ttl))
+            else:
+                entries.append((key, f"{version}:{NOT_FOUND}", self.negative_ttl))
+
+        if self.per_key:
+            FILL_SCRIPT(
+                keys=[self.redis_key(key) for key, _, _ in entries]
+                + [self.generation_key(key) for key, _, _ in entries],
+                args=[
+                    item
+                    for key, value, ttl in entries
+                    for item in (generations.get(key) or "0", value, ttl)
+                ],
+            )
+            return
+
+        pipe = redis_client.pipeline(transaction=False)
+        for key, value, ttl in entries:
+            pipe.set(self.redis_key(key), value, ex=ttl)
+        pipe.execute()
+
+    def get(self, key, load):
+        return self.get_many([key], load)[key]
+
+    def invalidate(self):
+        return invalidate_version(self.version_key)
+
+    def invalidate_key(self, key):
+        # Сбрасывает одну запись во всех процессах; заполнения, начатые до
+        # сброса, не запишутся из-за смены поколения.
+        redis_key = self.redis_key(key)
+        try:
+            pipe = redis_client.pipeline(transaction=True)
+            pipe.delete(redis_key)
+            pipe.incr(self.generation_key(key))
+            pipe.expire(self.generation_key(key), self.redis_ttl)
+            pipe.publish(INVALIDATION_CHANNEL, ENTRY_MESSAGE_PREFIX + redis_key)
+            pipe.execute()
+        except redis.RedisError:
+            logger.warning("Failed to invalidate %s", redis_key, exc_info=True)
+        self.local.discard(redis_key)
@@ -8,7 +8,16 @@ router.register(r"user", views.UserViewSet, basename="user")
 
 urlpatterns = [
     path(r"servers/", views.ServerList.as_view(), name="servers-list"),
+    path(r"servers/import/", views.ServerImport.as_view(), name="servers-import"),
+    path(r"servers/facets/", views.ServerFacets.as_view(), name="servers-facets"),
+    path(r"servers/changes/", views.ServerChanges.as_view(), name="servers-changes"),
+    path(r"servers/batch/", views.ServerBatch.as_view(), name="servers-batch"),
     path(r"servers/<int:pk>/", views.ServerDetail.as_view(), name="servers-detail"),
+    path(
+        r"servers/<int:pk>/recommendations/",
+        views.ServerRecommendations.as_view(),
+        name="servers-recommendations",
+    ),
     path(r"servers/spec/", views.ServerSpecList.as_view(), name="servers-spec-list"),
     path(
         r"servers/spec/<int:pk>/",
@@ -16,11 +25,23 @@ urlpatterns = [
         name="servers-spec-detail",
     ),
     path(r"app/", views.ApplicationList.as_view(), name="application-list"),
+    path("app/my/", views.MyApplicationList.as_view(), name="application-my-list"),
     path(
         r"app/<int:pk>/",
         views.ApplicationDetail.as_view(),
         name="application-detail",
     ),
+    path(
+        "app/events/",
+        views.ApplicationEventStream.as_view(),
+        name="application-events",
+    ),
+    path("app/claim/", views.ApplicationClaim.as_view(), name="application-claim"),
+    path(
+        "app/<int:pk>/claim/",
+        views.ApplicationRelease.as_view(),
+        name="application-release",
+    ),
     path(
         "app/<int:pk>/formed/",
         views.ApplicationFormed.as_view(),
@@ -33,6 +54,8 @@ urlpatterns = [
     ),
     path("", include(router.urls)),
     path("login/", views.LoginView.as_view(), name="login"),
+    path("login/async/", views.AsyncLoginView.as_view(), name="login-async"),
+    path("login-history/", views.LoginHistoryView.as_view(), name="login-history"),
     path("logout/", views.LogoutView.as_view(), name="logout"),
     path("user-me/", views.CurrentUserView.as_view(), name="current-user"),
     path(
@@ -1,4 +1,5 @@
 import redis
+import redis.asyncio
 from django.conf import settings
 
 redis_client = redis.StrictRedis(
@@ -7,3 +8,13 @@ redis_client = redis.StrictRedis(
     db=0,
     decode_responses=True
 )
+
+
+def get_async_redis_client():
+    # Асинхронный клиент привязан к циклу событий, поэтому создаётся на каждое соединение.
+    return redis.asyncio.StrictRedis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=0,
+        decode_responses=True,
+    )
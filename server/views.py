@@ -1,31 +1,126 @@
-import datetime
-from rest_framework.views import APIView
-from django.db.models import Q
+import base64
+import io
+import re
+from rest_framework.views import APIView, exception_handler
+from django.db import transaction
+from django.db.models import F, Prefetch, Q
 from rest_framework.response import Response
 from rest_framework import viewsets, status
 from django.shortcuts import get_object_or_404
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from django.contrib.auth.models import User
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import alogin, authenticate, login, logout
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.utils.dateparse import parse_datetime
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import ParseError, Throttled
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.request import Request
 from rest_framework.permissions import AllowAny, IsAuthenticated, BasePermission
-from .utils import redis_client
+from .authentication import authenticate_in_pool
+from .catalog import latest_catalog_change
+from .catalog_import import READERS, CatalogImporter
+from .compression import cached_json_response, unpack
+from .draft_cache import get_cached_draft, invalidate_draft, store_draft
+from .events import publish_status_change, stream_status_events
+from .facets import get_facets
+from .idempotency import idempotent
+from .jobs import enqueue
+from .login_history import logins_between, record_login, recent_logins
+from .moderation import claim_applications, lease_holder, release_application
+from .outbox import record_status_change
+from .recommendations import get_recommendations, record_formed_application
+from .routers import primary_reads
+from .server_cache import (
+    get_server_detail_response,
+    get_server_details,
+    get_spec_detail_response,
+)
 
 from .models import (
     Application,
     ApplicationServer,
     ApplicationStatus,
+    ArchivedApplication,
+    CatalogChange,
     Server,
     ServerSpecification,
 )
 from .serializers import (
     ApplicationSerializer,
+    ArchivedApplicationSerializer,
     LoginSerializer,
     ServerDetailSerializer,
     ServerSerializer,
     ServerSpecSerializer,
     UserSerializer,
 )
+from .throttling import LoginIPThrottle, LoginUsernameThrottle, SearchIPThrottle
+
+
+IDEMPOTENCY_KEY_PARAMETER = openapi.Parameter(
+    "Idempotency-Key",
+    openapi.IN_HEADER,
+    description="Повтор с тем же ключом вернёт сохранённый ответ первого запроса",
+    type=openapi.TYPE_STRING,
+)
+
+
+def parse_list_param(request, name):
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def is_integer(value):
+    # str.isdigit() пропускает "²" и другие цифры Unicode, на которых int() падает.
+    return re.fullmatch(r"\d+", value, re.ASCII) is not None
+
+
+def fields_error_response(fields, serializer_class):
+    # Пустой или неизвестный ?fields= - ошибка клиента, а не список пустых
+    # объектов.
+    if not fields:
+        return Response(
+            {"detail": "fields must name at least one field"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    unknown = set(fields) - set(serializer_class().fields)
+    if unknown:
+        return Response(
+            {"detail": f"Unknown fields: {', '.join(sorted(unknown))}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return None
+
+
+def sparse_applications(queryset, fields=None, expand=None):
+    # Сужает SELECT до запрошенных колонок и подгружает услуги одним
+    # prefetch-запросом, причём без JOIN на Server, если они не раскрываются.
+    if fields is not None:
+        columns = [
+            "id" if name == "pk" else name for name in fields if name != "servers"
+        ]
+        queryset = queryset.only(*columns or ["id"])
+        if "servers" not in fields:
+            return queryset
+
+    if expand is None or "servers" in expand:
+        app_servers = ApplicationServer.objects.select_related(
+            "server", "archived_server"
+        )
+    else:
+        app_servers = ApplicationServer.objects.only(
+            "id", "application_id", "server_id", "archived_server_id"
+        )
+    return queryset.prefetch_related(Prefetch("servers", queryset=app_servers))
 
 
 class IsModerator(BasePermission):
@@ -40,6 +135,7 @@ class IsModerator(BasePermission):
 class ServerList(APIView):
     model_class = Server
     serializer_class = ServerSerializer
+    throttle_classes = [SearchIPThrottle]
 
     def get_permissions(self):
         if self.request.method == "GET":
@@ -56,20 +152,33 @@ class ServerList(APIView):
                 description="Фильтр по имени или описанию",
                 type=openapi.TYPE_STRING,
             ),
+            openapi.Parameter(
+                "fields",
+                openapi.IN_QUERY,
+                description="Список полей через запятую",
+                type=openapi.TYPE_STRING,
+            ),
         ],
         tags=["servers/"],
     )
     def get(self, request, format=None):
         try:
             query = request.query_params.get("query", "")
-            servers = self.model_class.objects.filter(is_active=True)
+            servers = self.model_class.active.all()
+
+            fields = parse_list_param(request, "fields")
+            if fields is not None:
+                error = fields_error_response(fields, self.serializer_class)
+                if error is not None:
+                    return error
+                servers = servers.only(*fields)
 
             if query:
                 servers = servers.filter(
                     Q(name__icontains=query) | Q(mini_description__icontains=query)
                 ).distinct()
 
-            serializer = self.serializer_class(servers, many=True)
+            serializer = self.serializer_class(servers, many=True, fields=fields)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         except Exception as e:
@@ -78,14 +187,16 @@ class ServerList(APIView):
             )
 
     @swagger_auto_schema(
-        operation_summary="Создать новый сервер",
-        request_body=ServerSerializer,
-        responses={201: ServerSerializer},
+        operation_summary="Создать новый сервер вместе с характеристиками",
+        request_body=ServerDetailSerializer,
+        responses={201: ServerDetailSerializer},
+        manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
         tags=["servers/"],
     )
+    @idempotent
     def post(self, request, format=None):
         try:
-            serializer = self.serializer_class(data=request.data)
+            serializer = ServerDetailSerializer(data=request.data)
             if not serializer.is_valid():
                 return Response(
                     {"status": "error", "errors": serializer.errors},
@@ -103,6 +214,226 @@ class ServerList(APIView):
             )
 
 
+class ServerImport(APIView):
+    permission_classes = [IsModerator]
+    parser_classes = [MultiPartParser]
+
+    @swagger_auto_schema(
+        operation_summary="Импорт каталога из CSV или JSON Lines (upsert по external_id)",
+        manual_parameters=[
+            openapi.Parameter(
+                "file",
+                openapi.IN_FORM,
+                description="Файл фида",
+                type=openapi.TYPE_FILE,
+                required=True,
+            ),
+            openapi.Parameter(
+                "format",
+                openapi.IN_FORM,
+                description="csv или jsonl (по умолчанию - по расширению файла)",
+                type=openapi.TYPE_STRING,
+            ),
+        ],
+        tags=["servers/"],
+    )
+    def post(self, request, format=None):
+        try:
+            upload = request.FILES.get("file")
+            if upload is None:
+                return Response(
+                    {"detail": "file is required"}, status=status.HTTP_400_BAD_REQUEST
+                )
+
+            fmt = request.data.get("format") or upload.name.rsplit(".", 1)[-1].lower()
+            if fmt not in READERS:
+                return Response(
+                    {"detail": f"Unknown format '{fmt}'. Allowed: csv, jsonl."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            errors = []
+
+            def on_error(line, external_id, row_errors):
+                if len(errors) < settings.CATALOG_IMPORT_MAX_REPORTED_ERRORS:
+                    errors.append(
+                        {"line": line, "external_id": external_id, "errors": row_errors}
+                    )
+
+            stream = io.TextIOWrapper(upload.file, encoding="utf-8", newline="")
+            stats = CatalogImporter(settings.CATALOG_IMPORT_BATCH_SIZE, on_error).run(
+                READERS[fmt](stream)
+            )
+            return Response(
+                {"status": "success", "data": stats, "errors": errors},
+                status=status.HTTP_200_OK,
+            )
+        except Exception as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class ServerFacets(APIView):
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_summary="Фасеты каталога: ценовые диапазоны и значения характеристик",
+        tags=["servers/"],
+    )
+    def get(self, request, format=None):
+        try:
+            return cached_json_response(f'{{"status":"success","data":{get_facets()}}}')
+        except Exception as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class ServerChanges(APIView):
+    permission_classes = [AllowAny]
+    serializer_class = ServerDetailSerializer
+
+    @swagger_auto_schema(
+        operation_summary="Изменения каталога после номера since (дельта-синхронизация)",
+        operation_description=(
+            "Без since возвращает только текущий номер seq: его нужно получить "
+            "до полной загрузки servers/, а затем передавать в since. "
+            "410 означает, что журнал за этот период уже очищен и нужна полная "
+            "загрузка."
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                "since",
+                openapi.IN_QUERY,
+                description="Номер seq из предыдущего ответа",
+                type=openapi.TYPE_INTEGER,
+            ),
+        ],
+        tags=["servers/"],
+    )
+    def get(self, request, format=None):
+        try:
+            since = request.query_params.get("since")
+            if since is None:
+                return Response(
+                    {
+                        "status": "success",
+                        "data": {
+                            "seq": latest_catalog_change(),
+                            "has_more": False,
+                            "servers": [],
+                            "deleted": [],
+                        },
+                    },
+                    status=status.HTTP_200_OK,
+                )
+            if not is_integer(since):
+                return Response(
+                    {"detail": "since must be a non-negative integer"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            since = int(since)
+
+            oldest = (
+                CatalogChange.objects.order_by("id")
+                .values_list("id", flat=True)
+                .first()
+            )
+            if oldest is not None and since < oldest - 1:
+                return Response(
+                    {
+                        "detail": "Changes since this seq are no longer available",
+                        "seq": latest_catalog_change(),
+                    },
+                    status=status.HTTP_410_GONE,
+                )
+
+            page_size = settings.CATALOG_CHANGES_PAGE_SIZE
+            changes = list(
+                CatalogChange.objects.filter(id__gt=since)
+                .order_by("id")
+                .values_list("id", "server_id")[: page_size + 1]
+            )
+            has_more = len(changes) > page_size
+            changes = changes[:page_size]
+            server_ids = {server_id for _, server_id in changes}
+
+            # Деактивированные услуги отдаются с is_active=false, удалённые
+            # (архивированные) - только идентификатором в deleted.
+            servers = Server.objects.filter(pk__in=server_ids).prefetch_related(
+                "specifications"
+            )
+            data = self.serializer_class(servers, many=True).data
+            return Response(
+                {
+                    "status": "success",
+                    "data": {
+                        "seq": changes[-1][0] if changes else since,
+                        "has_more": has_more,
+                        "servers": data,
+                        "deleted": sorted(server_ids - {item["pk"] for item in data}),
+                    },
+                },
+                status=status.HTTP_200_OK,
+            )
+        except Exception as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class ServerBatch(APIView):
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_summary="Получить несколько серверов с характеристиками по списку ID",
+        responses={200: ServerDetailSerializer(many=True)},
+        manual_parameters=[
+            openapi.Parameter(
+                "ids",
+                openapi.IN_QUERY,
+                description="ID серверов через запятую",
+                type=openapi.TYPE_STRING,
+                required=True,
+            ),
+        ],
+        tags=["servers/"],
+    )
+    def get(self, request, format=None):
+        try:
+            ids = parse_list_param(request, "ids")
+            if not ids or not all(is_integer(item) for item in ids):
+                return Response(
+                    {"detail": "ids must be a comma-separated list of integers"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            ids = list(dict.fromkeys(int(item) for item in ids))
+            if len(ids) > settings.SERVER_BATCH_MAX_IDS:
+                return Response(
+                    {"detail": f"At most {settings.SERVER_BATCH_MAX_IDS} ids allowed"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            # Тела берутся из кэша готовыми строками и склеиваются без
+            # повторной сериализации; порядок - как в запросе.
+            details = get_server_details(ids)
+            data = ",".join(details[pk] for pk in ids if details[pk] is not None)
+            missing = ",".join(str(pk) for pk in ids if details[pk] is None)
+            return HttpResponse(
+                f'{{"status":"success","data":[{data}],"missing":[{missing}]}}',
+                content_type="application/json",
+            )
+        except Exception as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
 class ServerDetail(APIView):
     model_class = Server
     serializer_class = ServerDetailSerializer
@@ -119,12 +450,13 @@ class ServerDetail(APIView):
     )
     def get(self, request, pk, format=None):
         try:
-            server = get_object_or_404(self.model_class, pk=pk, is_active=True)
-            serializer = self.serializer_class(server)
-            return Response(
-                {"status": "success", "data": serializer.data},
-                status=status.HTTP_200_OK,
-            )
+            detail = get_server_detail_response(pk)
+            if detail is None:
+                return Response(
+                    {"detail": "No Server matches the given query."},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            return cached_json_response(*detail)
         except Exception as e:
             return Response(
                 {"status": "error", "detail": str(e)},
@@ -181,6 +513,37 @@ class ServerDetail(APIView):
             )
 
 
+class ServerRecommendations(APIView):
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_summary="Услуги, которые часто арендуют вместе с данной",
+        tags=["servers/{id}/"],
+    )
+    def get(self, request, pk, format=None):
+        try:
+            # Индекс строится офлайн (build_recommendations): здесь один
+            # ZREVRANGE и детали услуг из двухуровневого кэша. Запас в два раза
+            # покрывает неактивные услуги, которые отфильтруются.
+            limit = settings.RECOMMENDATIONS_TOP_K
+            related = get_recommendations(pk, limit * 2)
+            details = get_server_details([server_id for server_id, _ in related])
+            items = [
+                f'{{"count":{count},"server":{details[server_id]}}}'
+                for server_id, count in related
+                if details[server_id] is not None
+            ][:limit]
+            return HttpResponse(
+                f'{{"status":"success","data":[{",".join(items)}]}}',
+                content_type="application/json",
+            )
+        except Exception as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
 class ServerSpecList(APIView):
     model_class = ServerSpecification
     serializer_class = ServerSpecSerializer
@@ -260,12 +623,13 @@ class ServerSpecDetail(APIView):
     )
     def get(self, request, pk, format=None):
         try:
-            spec = get_object_or_404(self.model_class, pk=pk)
-            serializer = self.serializer_class(spec)
-            return Response(
-                {"status": "success", "data": serializer.data},
-                status=status.HTTP_200_OK,
-            )
+            detail = get_spec_detail_response(pk)
+            if detail is None:
+                return Response(
+                    {"detail": "No ServerSpecification matches the given query."},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            return cached_json_response(*detail)
         except Exception as e:
             return Response(
                 {"status": "error", "detail": str(e)},
@@ -333,6 +697,18 @@ class ApplicationList(APIView):
                 description="Фильтр по имени статуса заявки",
                 type=openapi.TYPE_STRING,
             ),
+            openapi.Parameter(
+                "fields",
+                openapi.IN_QUERY,
+                description="Список полей через запятую",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "expand",
+                openapi.IN_QUERY,
+                description="'servers' - вложить услуги целиком, иначе только их id",
+                type=openapi.TYPE_STRING,
+            ),
         ],
         responses={200: ApplicationSerializer(many=True)},
         tags=["app/"],
@@ -347,7 +723,17 @@ class ApplicationList(APIView):
             if status_name:
                 applications = applications.filter(status=status_name)
 
-            serializer = self.serializer_class(applications, many=True)
+            fields = parse_list_param(request, "fields")
+            expand = parse_list_param(request, "expand")
+            if fields is not None:
+                error = fields_error_response(fields, self.serializer_class)
+                if error is not None:
+                    return error
+            applications = sparse_applications(applications, fields, expand)
+
+            serializer = self.serializer_class(
+                applications, many=True, fields=fields, context={"expand": expand}
+            )
             return Response(
                 {"status": "success", "data": serializer.data},
                 status=status.HTTP_200_OK,
@@ -359,6 +745,126 @@ class ApplicationList(APIView):
             )
 
 
+def encode_cursor(item):
+    raw = f"{item.created_at.isoformat()}|{item.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if created_at is None:
+        return None
+    return created_at, pk
+
+
+class MyApplicationList(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_summary="История заявок текущего пользователя (новые первыми)",
+        manual_parameters=[
+            openapi.Parameter(
+                "status",
+                openapi.IN_QUERY,
+                description="Статусы через запятую (по умолчанию все, кроме DELETED)",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "cursor",
+                openapi.IN_QUERY,
+                description="next_cursor из предыдущей страницы",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "limit",
+                openapi.IN_QUERY,
+                description="Размер страницы",
+                type=openapi.TYPE_INTEGER,
+            ),
+        ],
+        tags=["app/"],
+    )
+    def get(self, request, format=None):
+        try:
+            statuses = parse_list_param(request, "status")
+            if statuses is not None:
+                unknown = set(statuses) - set(ApplicationStatus.values)
+                if unknown:
+                    return Response(
+                        {"detail": f"Unknown statuses: {', '.join(sorted(unknown))}"},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+
+            limit = request.query_params.get("limit", "")
+            limit = (
+                int(limit) if is_integer(limit) else settings.MY_APPLICATIONS_PAGE_SIZE
+            )
+            limit = min(max(limit, 1), settings.MY_APPLICATIONS_MAX_PAGE_SIZE)
+
+            # Keyset по (created_at, id) идёт по индексу
+            # (user_creator, created_at, id) и не деградирует на дальних
+            # страницах, в отличие от OFFSET.
+            keyset = Q()
+            cursor = request.query_params.get("cursor")
+            if cursor:
+                position = decode_cursor(cursor)
+                if position is None:
+                    return Response(
+                        {"detail": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST
+                    )
+                created_at, pk = position
+                keyset = Q(created_at__lt=created_at)
+                keyset |= Q(created_at=created_at, id__lt=pk)
+
+            def page(queryset):
+                queryset = queryset.filter(keyset, user_creator=request.user)
+                if statuses is not None:
+                    queryset = queryset.filter(status__in=statuses)
+                else:
+                    queryset = queryset.exclude(status=ApplicationStatus.DELETED)
+                return queryset.order_by("-created_at", "-id")[: limit + 1]
+
+            # Архивные заявки - часть той же истории: обе таблицы читаются
+            # с одинаковым keyset и сливаются, итого три запроса на страницу.
+            items = sorted(
+                [
+                    *sparse_applications(page(Application.objects)),
+                    *page(ArchivedApplication.objects),
+                ],
+                key=lambda item: (item.created_at, item.pk),
+                reverse=True,
+            )
+            has_more = len(items) > limit
+            items = items[:limit]
+
+            data = [
+                (
+                    ArchivedApplicationSerializer(item)
+                    if isinstance(item, ArchivedApplication)
+                    else ApplicationSerializer(item)
+                ).data
+                for item in items
+            ]
+            return Response(
+                {
+                    "status": "success",
+                    "data": data,
+                    "next_cursor": encode_cursor(items[-1]) if has_more else None,
+                },
+                status=status.HTTP_200_OK,
+            )
+        except Exception as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
 class ApplicationDetail(APIView):
     model_class = Application
     serializer_class = ApplicationSerializer
@@ -382,10 +888,15 @@ class ApplicationDetail(APIView):
     )
     def get(self, request, pk, format=None):
         try:
-            application = get_object_or_404(self.model_class, pk=pk)
+            application = self.model_class.objects.filter(pk=pk).first()
+            serializer_class = self.serializer_class
+            if application is None:
+                # Старые завершённые заявки живут в архивной таблице.
+                application = get_object_or_404(ArchivedApplication, pk=pk)
+                serializer_class = ArchivedApplicationSerializer
 
             if not (request.user.is_staff or request.user.is_superuser):
-                if application.user_creator != request.user:
+                if application.user_creator_id != request.user.pk:
                     return Response(
                         {
                             "detail": "You do not have permission to view this application."
@@ -393,7 +904,7 @@ class ApplicationDetail(APIView):
                         status=status.HTTP_403_FORBIDDEN,
                     )
 
-            serializer = self.serializer_class(application)
+            serializer = serializer_class(application)
             return Response(
                 {"status": "success", "data": serializer.data},
                 status=status.HTTP_200_OK,
@@ -437,8 +948,22 @@ class ApplicationDetail(APIView):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            application.status = new_status
-            application.save()
+            holder = lease_holder(application)
+            if holder is not None and holder != request.user.pk:
+                return Response(
+                    {"detail": "The application is claimed by another moderator."},
+                    status=status.HTTP_409_CONFLICT,
+                )
+
+            previous_status = application.status
+            with transaction.atomic():
+                application.status = new_status
+                application.user_moderator = request.user
+                application.claimed_until = None
+                application.save()
+                record_status_change(application, previous_status, request.user)
+            invalidate_draft(application.user_creator_id)
+            publish_status_change(application)
 
             serializer = self.serializer_class(application)
             return Response(
@@ -478,8 +1003,13 @@ class ApplicationDetail(APIView):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            application.status = ApplicationStatus.DELETED
-            application.save()
+            previous_status = application.status
+            with transaction.atomic():
+                application.status = ApplicationStatus.DELETED
+                application.save()
+                record_status_change(application, previous_status, request.user)
+            invalidate_draft(application.user_creator_id)
+            publish_status_change(application)
 
             serializer = self.serializer_class(application)
             return Response(
@@ -497,6 +1027,75 @@ class ApplicationDetail(APIView):
             )
 
 
+class ApplicationClaim(APIView):
+    model_class = Application
+    serializer_class = ApplicationSerializer
+    permission_classes = [IsModerator]
+
+    @swagger_auto_schema(
+        operation_summary="Взять в работу следующие сформированные заявки",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={"limit": openapi.Schema(type=openapi.TYPE_INTEGER)},
+        ),
+        responses={200: ApplicationSerializer(many=True)},
+        tags=["app/claim/"],
+    )
+    def post(self, request, format=None):
+        try:
+            try:
+                limit = int(request.data.get("limit", 1))
+            except (TypeError, ValueError):
+                limit = 0
+
+            if not 1 <= limit <= settings.MODERATION_CLAIM_MAX:
+                return Response(
+                    {
+                        "detail": f"limit must be between 1 and {settings.MODERATION_CLAIM_MAX}"
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            applications = claim_applications(request.user, limit)
+            serializer = self.serializer_class(applications, many=True)
+            return Response(
+                {
+                    "status": "success",
+                    "data": serializer.data,
+                    "lease_seconds": settings.MODERATION_LEASE_SECONDS,
+                },
+                status=status.HTTP_200_OK,
+            )
+        except Exception as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class ApplicationRelease(APIView):
+    permission_classes = [IsModerator]
+
+    @swagger_auto_schema(
+        operation_summary="Вернуть взятую в работу заявку в общую очередь",
+        responses={204: "No Content"},
+        tags=["app/{id}/claim/"],
+    )
+    def delete(self, request, pk, format=None):
+        try:
+            if not release_application(pk, request.user):
+                return Response(
+                    {"detail": "The application is not claimed by you."},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        except Exception as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
 class ApplicationFormed(APIView):
     model_class = Application
     serializer_class = ApplicationSerializer
@@ -505,8 +1104,10 @@ class ApplicationFormed(APIView):
     @swagger_auto_schema(
         operation_summary="Установить для заявки статус 'formed(сформирована)'",
         responses={200: ApplicationSerializer},
+        manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
         tags=["app/{id}/formed"],
     )
+    @idempotent
     def put(self, request, pk, format=None):
         try:
             application = get_object_or_404(self.model_class, pk=pk)
@@ -525,8 +1126,14 @@ class ApplicationFormed(APIView):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            application.status = ApplicationStatus.FORMED
-            application.save()
+            previous_status = application.status
+            with transaction.atomic():
+                application.status = ApplicationStatus.FORMED
+                application.save()
+                record_status_change(application, previous_status, request.user)
+            invalidate_draft(application.user_creator_id)
+            publish_status_change(application)
+            enqueue(record_formed_application, application.pk)
 
             serializer = self.serializer_class(application)
             return Response(
@@ -544,6 +1151,25 @@ class ApplicationFormed(APIView):
             )
 
 
+class ApplicationEventStream(View):
+    # Server-Sent Events: обычный асинхронный view Django, так как APIView
+    # из DRF не умеет работать в async-режиме под ASGI.
+    async def get(self, request):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse(
+                {"detail": "Authentication credentials were not provided."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        response = StreamingHttpResponse(
+            stream_status_events(user), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
 class ApplicationDeleteServer(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -578,7 +1204,13 @@ class ApplicationDeleteServer(APIView):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            app_server.delete()
+            with transaction.atomic():
+                app_server.delete()
+                Application.objects.filter(pk=app_server.application_id).update(
+                    total_price=F("total_price") - app_server.price
+                )
+            app_server.application.refresh_from_db(fields=["total_price"])
+            store_draft(request.user.pk, app_server.application)
             return Response(
                 {
                     "status": "success",
@@ -631,6 +1263,7 @@ class UserViewSet(viewsets.ModelViewSet):
 #         )
 class LoginView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [LoginIPThrottle, LoginUsernameThrottle]
 
     @swagger_auto_schema(
         operation_summary="Вход пользователя (логин)",
@@ -649,17 +1282,155 @@ class LoginView(APIView):
         )
         if user is not None:
             login(request, user)
-
-            log_key = f"user_login:{user.username}"
-            timestamp = datetime.datetime.now().isoformat()
-            redis_client.lpush(log_key, timestamp)
-            redis_client.ltrim(log_key, 0, 99)
+            record_login(user.username)
             return Response({"detail": "Successfully logged in."})
         return Response(
             {"detail": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED
         )
 
 
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncLoginView(View):
+    # Тот же вход, что и LoginView, но для ASGI: хэш пароля проверяется
+    # в ограниченном пуле потоков и не блокирует поток sync-view.
+    # Лимиты и ответ 429 - те же, что у LoginView.
+    throttle_view = LoginView
+
+    async def post(self, request):
+        drf_request = Request(
+            request, parsers=[JSONParser(), FormParser(), MultiPartParser()]
+        )
+
+        try:
+            await sync_to_async(
+                self.throttle_view().check_throttles, thread_sensitive=False
+            )(drf_request)
+            serializer = LoginSerializer(data=drf_request.data)
+        except (ParseError, Throttled) as e:
+            error = exception_handler(e, {"view": self, "request": drf_request})
+            response = JsonResponse(error.data, status=error.status_code)
+            if error.has_header("Retry-After"):
+                response["Retry-After"] = error["Retry-After"]
+            return response
+
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        user = await authenticate_in_pool(
+            request,
+            serializer.validated_data["username"],
+            serializer.validated_data["password"],
+        )
+        if user is None:
+            return JsonResponse(
+                {"detail": "Invalid credentials"},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+
+        await alogin(request, user)
+        await sync_to_async(record_login, thread_sensitive=False)(user.username)
+        return JsonResponse({"detail": "Successfully logged in."})
+
+
+class LoginHistoryView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def _parse_moment(self, value):
+        moment = parse_datetime(value)
+        if moment is not None and timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
+
+    @swagger_auto_schema(
+        operation_summary="История входов пользователя",
+        manual_parameters=[
+            openapi.Parameter(
+                "username",
+                openapi.IN_QUERY,
+                description="Имя пользователя (только для модераторов)",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "scope",
+                openapi.IN_QUERY,
+                description="'all' - входы всех пользователей (только для модераторов)",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "since",
+                openapi.IN_QUERY,
+                description="Начало интервала (ISO 8601)",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "until",
+                openapi.IN_QUERY,
+                description="Конец интервала (ISO 8601)",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "limit",
+                openapi.IN_QUERY,
+                description="Максимальное число записей",
+                type=openapi.TYPE_INTEGER,
+            ),
+        ],
+        tags=["auth"],
+    )
+    def get(self, request):
+        try:
+            is_moderator = request.user.is_staff or request.user.is_superuser
+            username = request.query_params.get("username", request.user.username)
+            scope = request.query_params.get("scope")
+
+            if (scope == "all" or username != request.user.username) and not is_moderator:
+                return Response(
+                    {"detail": "You do not have permission to view this login history."},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
+
+            bounds = {}
+            for name in ("since", "until"):
+                value = request.query_params.get(name)
+                if not value:
+                    continue
+                moment = self._parse_moment(value)
+                if moment is None:
+                    return Response(
+                        {"detail": f"Invalid '{name}' datetime."},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                bounds[name] = moment
+
+            try:
+                limit = int(request.query_params.get("limit", 20))
+            except ValueError:
+                limit = 0
+            if not 1 <= limit <= settings.LOGIN_HISTORY_QUERY_MAX:
+                return Response(
+                    {
+                        "detail": f"limit must be between 1 and {settings.LOGIN_HISTORY_QUERY_MAX}"
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            if scope == "all":
+                data = logins_between(limit, **bounds)
+            else:
+                data = [
+                    {"username": username, "logged_in_at": moment}
+                    for moment in recent_logins(username, limit, **bounds)
+                ]
+            return Response(
+                {"status": "success", "data": data}, status=status.HTTP_200_OK
+            )
+        except Exception as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
 class LogoutView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -695,8 +1466,10 @@ class DraftApplicationServerView(APIView):
             },
         ),
         responses={200: "Application с добавленной услугой"},
+        manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
         tags=["applic/draft/"],
     )
+    @idempotent
     def post(self, request):
         user = request.user
         server_id = request.data.get("server_id")
@@ -707,7 +1480,7 @@ class DraftApplicationServerView(APIView):
             )
 
         try:
-            server = Server.objects.get(pk=server_id, is_active=True)
+            server = Server.active.get(pk=server_id)
         except Server.DoesNotExist:
             return Response(
                 {"detail": "Service not found or inactive"}, status=status.HTTP_404_NOT_FOUND
@@ -724,14 +1497,18 @@ class DraftApplicationServerView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        ApplicationServer.objects.create(application=application, server=server)
+        with transaction.atomic():
+            ApplicationServer.objects.create(
+                application=application, server=server, price=server.price
+            )
+            Application.objects.filter(pk=application.pk).update(
+                total_price=F("total_price") + server.price
+            )
+        application.refresh_from_db(fields=["total_price"])
+
+        entry = store_draft(user.pk, application)
+        return cached_json_response(*unpack(entry))
 
-        serializer = ApplicationSerializer(application)
-        return Response(
-            {"status": "success", "data": serializer.data},
-            status=status.HTTP_200_OK,
-        )
-    
     @swagger_auto_schema(
         operation_summary="Получить черновую заявку текущего пользователя, если есть",
         responses={200: ApplicationSerializer},
@@ -740,17 +1517,20 @@ class DraftApplicationServerView(APIView):
     def get(self, request):
         user = request.user
 
-        application = Application.objects.filter(
-            user_creator=user, status=ApplicationStatus.DRAFT
-        ).first()
-
-        if not application:
+        # Корзина читается чаще всего остального: при попадании в кэш
+        # ответ отдаётся без обращений к базе.
+        hit, entry, draft_version = get_cached_draft(user.pk)
+        if not hit:
+            with primary_reads():
+                application = Application.objects.filter(
+                    user_creator=user, status=ApplicationStatus.DRAFT
+                ).first()
+                entry = store_draft(user.pk, application, draft_version)
+
+        if entry is None:
             return Response(
                 {"detail": "No draft application found"},
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        serializer = ApplicationSerializer(application)
-        return Response(
-            {"status": "success", "data": serializer.data}, status=status.HTTP_200_OK
-        )
\ No newline at end of file
+        return cached_json_response(*unpack(entry))
\ No newline at end of file